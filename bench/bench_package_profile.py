@@ -0,0 +1,89 @@
+# Copyright (C) 2026 Entidad Pública Empresarial Red.es
+#
+# This file is part of "dge-scheming (datos.gob.es)".
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+'''
+Time the profile helpers called by the validators of every resource field,
+at 10, 1k and 10k resources, against the full scan of the flattened dict
+they replaced, which is quadratic in the number of resources.
+
+Run it from the root of the extension, in an environment with CKAN and the
+dev requirements installed:
+
+    python bench/bench_package_profile.py [max resources of the full scan]
+
+The full scan is only timed up to 1000 resources by default, at 10k it
+takes minutes.
+'''
+
+import sys
+import timeit
+
+import ckanext.dge_scheming.constants as ds_constants
+import ckanext.dge_scheming.helpers as dh
+from ckanext.dge_scheming.tests.test_package_profile import flattened_dataset
+
+
+def reference_has_guid(dataset_dict):
+    return any(
+        key[0] == ds_constants.EXTRAS
+        and key[2] == ds_constants.KEY
+        and value == ds_constants.GUID_KEY
+        for key, value in dataset_dict.items()
+        if isinstance(key, tuple) and len(key) == 3)
+
+
+def reference_application_profile(dataset_dict):
+    for key, value in dataset_dict.items():
+        if isinstance(key, tuple) and len(key) == 3 \
+                and key[0] == ds_constants.EXTRAS \
+                and key[2] == ds_constants.KEY \
+                and value == ds_constants.APPLICATION_PROFILE_KEY:
+            return dataset_dict.get(
+                (ds_constants.EXTRAS, key[1], ds_constants.VALUE))
+
+
+def validate_reference(data):
+    for key in data:
+        reference_has_guid(data)
+        reference_application_profile(data)
+
+
+def validate(data):
+    context = {}
+    for key in data:
+        profile = dh.dge_get_package_profile(data, context)
+        profile.has_guid
+        profile.application_profile
+        dh.dge_has_guid(data)
+        dh.dge_get_application_profile(data)
+
+
+def main(reference_limit):
+    for num_resources in (10, 1000, 10000):
+        data = dict(flattened_dataset(num_resources))
+        runs = (('scan', validate_reference), ('profile', validate))
+        for label, run in runs:
+            if label == 'scan' and num_resources > reference_limit:
+                continue
+            seconds = timeit.timeit(lambda: run(data), number=1)
+            print('{:8} {:>6} resources {:>7} keys {:10.3f}s'.format(
+                label, num_resources, len(data), seconds))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
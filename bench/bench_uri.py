@@ -0,0 +1,51 @@
+# Copyright (C) 2026 Entidad Pública Empresarial Red.es
+#
+# This file is part of "dge-scheming (datos.gob.es)".
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+'''
+Time dge_is_uri against the rfc3987 implementation it replaced.
+
+Run it from the root of the extension, in an environment with CKAN and the
+dev requirements installed:
+
+    python bench/bench_uri.py [number of URIs]
+'''
+
+import sys
+import timeit
+
+import ckanext.dge_scheming.helpers as dh
+from ckanext.dge_scheming.tests.test_uri_grammar import (
+    reference_is_uri, uri_corpus)
+
+
+def main(size):
+    http_uris = ['https://datos.gob.es/catalogo/e{:08d}-dataset-{}'.format(i, i)
+                 for i in range(size)]
+    mixed_uris = uri_corpus(size // 2)
+    dh.dge_configure_uri_cache(0)
+    for name, values in (('http(s)', http_uris), ('mixed', mixed_uris)):
+        for label, check in (('rfc3987', reference_is_uri),
+                             ('grammar', dh._dge_is_uri)):
+            seconds = timeit.timeit(
+                lambda: [check(value) for value in values], number=1)
+            print('{:8} {:8} {:>8} URIs {:8.3f}s'.format(
+                name, label, len(values), seconds))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,142 @@
+# Copyright (C) 2026 Entidad Pública Empresarial Red.es
+#
+# This file is part of "dge-scheming (datos.gob.es)".
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import logging
+
+import ckan.authz as authz
+import ckan.plugins.toolkit as toolkit
+
+import ckanext.dge_scheming.constants as ds_constants
+import ckanext.dge_scheming.model as ds_model
+from ckanext.dge_scheming import helpers
+
+log = logging.getLogger(__name__)
+
+
+@toolkit.side_effect_free
+def dge_dataservice_datasets(context, data_dict):
+    '''
+    Return the active datasets with resources served by a data service,
+    from the dge_dataservice_reference index. Private datasets are only
+    returned to sysadmins.
+
+    :param uri: access_service URI of the data service
+    :type uri: string
+    :param limit: maximum number of datasets returned (optional, default 100)
+    :type limit: int
+    :param offset: number of datasets skipped (optional, default 0)
+    :type offset: int
+
+    :returns: the total number of datasets ('count') and the requested ones
+        ('results') with their 'id', 'name' and served 'resources' ids
+    :rtype: dictionary
+    '''
+    toolkit.check_access('dge_dataservice_datasets', context, data_dict)
+    uri = toolkit.get_or_bust(data_dict, 'uri')
+    limit = _int_param(
+        data_dict, 'limit', ds_constants.DATASERVICE_DATASETS_DEFAULT_LIMIT)
+    offset = _int_param(data_dict, 'offset', 0)
+    limit = min(max(limit, 0), ds_constants.DATASERVICE_DATASETS_MAX_LIMIT)
+
+    count, results = ds_model.find_dataservice_references(
+        uri, include_private=authz.is_sysadmin(context.get('user')),
+        limit=limit, offset=max(offset, 0))
+    return {'count': count, 'results': results}
+
+
+def _int_param(data_dict, key, default):
+    try:
+        return int(data_dict.get(key, default))
+    except (TypeError, ValueError):
+        raise toolkit.ValidationError({key: [toolkit._('Invalid integer')]})
+
+
+def dge_dataservice_replace(context, data_dict):
+    '''
+    Queue a background job that replaces a data service URI with another
+    one, or removes it, in the access_service of every resource and the
+    served_by_dataservice of every dataset that use it. To be called when
+    a data service is renamed or deleted, once backfill-dataservices has
+    completed. Only for sysadmins.
+
+    :param old_uri: access_service URI of the data service
+    :type old_uri: string
+    :param new_uri: new URI of the data service, omit it to remove the
+        references (optional)
+    :type new_uri: string
+
+    :returns: the id of the queued job ('job_id')
+    :rtype: dictionary
+    '''
+    toolkit.check_access('dge_dataservice_replace', context, data_dict)
+    old_uri = toolkit.get_or_bust(data_dict, 'old_uri')
+    new_uri = data_dict.get('new_uri') or None
+    if not ds_model.is_backfill_complete(
+            ds_constants.BACKFILL_DATASERVICES_CHECKPOINT):
+        raise toolkit.ValidationError({'old_uri': [toolkit._(
+            'The data service index is not complete, run the '
+            'backfill-dataservices command first')]})
+    from ckanext.dge_scheming.jobs import replace_dataservice
+    job = toolkit.enqueue_job(
+        replace_dataservice, [old_uri, new_uri],
+        title='dge_scheming replace data service {}'.format(old_uri))
+    return {'job_id': job.id}
+
+
+@toolkit.side_effect_free
+def dge_uri_cache_info(context, data_dict):
+    '''
+    Return the size, maxsize, hits and misses of the URI/URL validity cache
+    of the process serving the request, to help sizing
+    ckanext.dge-scheming.uri_cache_size. Only for sysadmins.
+
+    :rtype: dictionary
+    '''
+    toolkit.check_access('dge_uri_cache_info', context, data_dict)
+    return helpers.dge_uri_cache_info()
+
+
+@toolkit.auth_allow_anonymous_access
+def dge_dataservice_datasets_auth(context, data_dict):
+    return {'success': True}
+
+
+def dge_dataservice_replace_auth(context, data_dict):
+    # Only sysadmins, who skip the auth functions
+    return {'success': False}
+
+
+def dge_uri_cache_info_auth(context, data_dict):
+    # Only sysadmins, who skip the auth functions
+    return {'success': False}
+
+
+def get_actions():
+    return {
+        'dge_dataservice_datasets': dge_dataservice_datasets,
+        'dge_dataservice_replace': dge_dataservice_replace,
+        'dge_uri_cache_info': dge_uri_cache_info,
+    }
+
+
+def get_auth_functions():
+    return {
+        'dge_dataservice_datasets': dge_dataservice_datasets_auth,
+        'dge_dataservice_replace': dge_dataservice_replace_auth,
+        'dge_uri_cache_info': dge_uri_cache_info_auth,
+    }
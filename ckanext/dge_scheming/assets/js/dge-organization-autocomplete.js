@@ -0,0 +1,27 @@
+/* Selector de organizaciones que carga las opciones bajo demanda.
+ * Se usa detras del modulo autocomplete en el mismo elemento
+ * (data-module="autocomplete dge-organization-autocomplete") para mostrar
+ * el nombre de la organizacion seleccionada, de la que el input solo
+ * contiene el id.
+ *
+ * selectedId   - id de la organizacion seleccionada
+ * selectedText - nombre de la organizacion seleccionada
+ */
+this.ckan.module('dge-organization-autocomplete', function (jQuery) {
+  return {
+    options: {
+      selectedId: null,
+      selectedText: null
+    },
+
+    initialize: function () {
+      if (this.options.selectedId === null || !this.el.data('select2')) {
+        return;
+      }
+      this.el.select2('data', {
+        id: String(this.options.selectedId),
+        text: String(this.options.selectedText)
+      });
+    }
+  };
+});
@@ -0,0 +1,125 @@
+# Copyright (C) 2026 Entidad Pública Empresarial Red.es
+#
+# This file is part of "dge-scheming (datos.gob.es)".
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import logging
+import time
+
+import click
+
+import ckan.model as model
+
+import ckanext.dge_scheming.constants as ds_constants
+import ckanext.dge_scheming.model as ds_model
+
+log = logging.getLogger(__name__)
+
+
+@click.group(u'dge-scheming', short_help=u'ckanext-dge-scheming commands')
+def dge_scheming():
+    pass
+
+
+@dge_scheming.command(u'backfill-identifiers')
+@click.option(u'--chunk-size', default=ds_constants.BACKFILL_DEFAULT_CHUNK_SIZE,
+              show_default=True, help=u'package_extra rows per transaction')
+@click.option(u'--restart', is_flag=True,
+              help=u'Ignore the saved checkpoint and start from the beginning')
+def backfill_identifiers(chunk_size, restart):
+    u'''
+    Fill the dge_package_identifier index from the identifier extras.
+    Each chunk is committed with its checkpoint, so an interrupted run
+    resumes where it stopped.
+    '''
+    _backfill(ds_model.index_identifier_extras,
+              ds_constants.BACKFILL_IDENTIFIERS_CHECKPOINT,
+              chunk_size, restart, u'Identifier index')
+
+
+@dge_scheming.command(u'backfill-dataservices')
+@click.option(u'--chunk-size', default=ds_constants.BACKFILL_DEFAULT_CHUNK_SIZE,
+              show_default=True, help=u'resource rows per transaction')
+@click.option(u'--restart', is_flag=True,
+              help=u'Ignore the saved checkpoint and start from the beginning')
+def backfill_dataservices(chunk_size, restart):
+    u'''
+    Fill the dge_dataservice_reference index from the access_service of
+    the resources.
+    Each chunk is committed with its checkpoint, so an interrupted run
+    resumes where it stopped.
+    '''
+    _backfill(ds_model.index_resource_access_services,
+              ds_constants.BACKFILL_DATASERVICES_CHECKPOINT,
+              chunk_size, restart, u'Data service index')
+
+
+@dge_scheming.command(u'replace-dataservice')
+@click.argument(u'old_uri')
+@click.argument(u'new_uri', required=False)
+@click.option(u'--chunk-size',
+              default=ds_constants.DATASERVICE_JOB_DEFAULT_CHUNK_SIZE,
+              show_default=True, help=u'resources per transaction')
+def replace_dataservice(old_uri, new_uri, chunk_size):
+    u'''
+    Replace the data service OLD_URI with NEW_URI, or remove it if NEW_URI
+    is not given, in every resource and dataset that use it.
+    It can be run again safely if it is interrupted.
+    Requires a complete backfill-dataservices.
+    '''
+    from ckanext.dge_scheming import jobs
+    if not ds_model.is_backfill_complete(
+            ds_constants.BACKFILL_DATASERVICES_CHECKPOINT):
+        raise click.ClickException(
+            u'Run backfill-dataservices until it completes first')
+    total = jobs.replace_dataservice(old_uri, new_uri, chunk_size)
+    click.secho(u'{} resources updated'.format(total), fg=u'green')
+
+
+def _backfill(index_chunk, checkpoint, chunk_size, restart, label):
+    ds_model.setup()
+    after_id = None if restart else ds_model.get_checkpoint(checkpoint)
+    if after_id == ds_constants.BACKFILL_COMPLETE:
+        after_id = None
+    if after_id:
+        click.echo(u'Resuming after {}'.format(after_id))
+
+    total = 0
+    start = time.time()
+    while True:
+        try:
+            count, after_id = index_chunk(after_id, chunk_size)
+            if not count:
+                break
+            ds_model.set_checkpoint(checkpoint, after_id)
+            model.Session.commit()
+        except Exception:
+            model.Session.rollback()
+            raise
+        total += count
+        elapsed = max(time.time() - start, 1e-6)
+        click.echo(u'{} rows indexed ({:.0f} rows/s)'.format(
+            total, total / elapsed))
+
+    # Kept as a marker: the index is only used once it is complete
+    ds_model.set_checkpoint(checkpoint, ds_constants.BACKFILL_COMPLETE)
+    model.Session.commit()
+    click.secho(u'{} backfilled: {} rows in {:.1f}s'.format(
+        label, total, time.time() - start), fg=u'green')
+
+
+def get_commands():
+    return [dge_scheming]
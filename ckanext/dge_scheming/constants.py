@@ -35,6 +35,7 @@ FORMAT_KEY = 'format'
 ACCESS_URL_KEY = 'access_url'
 URL_KEY = 'url'
 IDENTIFIER_KEY = ('identifier',)
+IDENTIFIER_EXTRA_KEY = 'identifier'
 GUID_KEY = 'guid'
 APPLICATION_PROFILE_KEY = 'application_profile'
 GUID_KEY = 'guid'
@@ -42,10 +43,62 @@ SERVED_BY_DATASERVICE_KEY = 'served_by_dataservice'
 DCATAPES_100 = 'dcatapes_100'
 NTI = 'nti'
 EXTRAS = 'extras'
+RESOURCES = 'resources'
 KEY = 'key'
 VALUE = 'value'
+SPATIAL_TERRITORY_PREFIX = 'http://datos.gob.es/recurso/sector-publico/territorio/'
+SPATIAL_KIND_COUNTRY = 'Pais'
+SPATIAL_KIND_COMMUNITY = 'Autonomia'
+SPATIAL_INDEX_FIELD = 'vocab_dge_spatial'
+THEME_INDEX_FIELD = 'vocab_dge_theme'
+THEME_DCAT_AP_INDEX_FIELD = 'vocab_dge_theme_dcat_ap'
+LANGUAGE_INDEX_FIELD = 'vocab_dge_language'
+FREQUENCY_INDEX_FIELD = 'vocab_dge_frequency'
+TEMPORAL_KEY = 'coverage_new'
+TEMPORAL_START_INDEX_FIELD = 'dge_temporal_start_date'
+TEMPORAL_END_INDEX_FIELD = 'dge_temporal_end_date'
+DCAT_AP_THEME_PREFIX = 'http://publications.europa.eu/resource/authority/data-theme/'
 DATOSGOBES_THEME_PREFIX = 'http://datos.gob.es/kos/sector-publico/sector/'
 FREQUENCY_EUROPEAN_PREFIX = 'http://publications.europa.eu/resource/authority/frequency/'
+PACKAGE_PROFILE_CONTEXT_KEY = 'dge_package_profile'
+ACCESS_SERVICE_CHANGES_CONTEXT_KEY = 'dge_access_service_changes'
+EXTRAS_INDEX_CONTEXT_KEY = 'dge_extras_index'
+PENDING_JOBS_SESSION_KEY = 'dge_pending_jobs'
+URI_CACHE_SIZE_CONFIG = 'ckanext.dge-scheming.uri_cache_size'
+URI_CACHE_DEFAULT_SIZE = 50000
+URI_CACHE_RULE_URI = 'uri'
+URI_CACHE_RULE_URL = 'url'
+ORGANIZATION_CACHE_SIZE_CONFIG = 'ckanext.dge-scheming.organization_cache_size'
+ORGANIZATION_CACHE_DEFAULT_SIZE = 1000
+ORGANIZATION_CACHE_TTL_CONFIG = 'ckanext.dge-scheming.organization_cache_ttl'
+ORGANIZATION_CACHE_DEFAULT_TTL = 300
+ORGANIZATION_AUTOCOMPLETE_CONFIG = 'ckanext.dge-scheming.organization_autocomplete'
+ORGANIZATION_SEARCH_DEFAULT_LIMIT = 20
+ORGANIZATION_SEARCH_MAX_LIMIT = 100
+ORGANIZATION_TITLE_TRANSLATED_KEY = 'title_translated'
+BACKFILL_IDENTIFIERS_CHECKPOINT = 'backfill_identifiers'
+BACKFILL_DATASERVICES_CHECKPOINT = 'backfill_dataservices'
+BACKFILL_DEFAULT_CHUNK_SIZE = 1000
+# Checkpoint value of a backfill that has finished
+BACKFILL_COMPLETE = 'complete'
+DATASERVICE_DATASETS_DEFAULT_LIMIT = 100
+DATASERVICE_DATASETS_MAX_LIMIT = 1000
+LICENSE_JOB_THRESHOLD_CONFIG = 'ckanext.dge-scheming.license_job_threshold'
+LICENSE_JOB_DEFAULT_THRESHOLD = 0
+LICENSE_JOB_CHUNK_SIZE_CONFIG = 'ckanext.dge-scheming.license_job_chunk_size'
+LICENSE_JOB_DEFAULT_CHUNK_SIZE = 500
+DATASERVICE_JOB_DEFAULT_CHUNK_SIZE = 500
+KNOWN_VOCABULARY_URI_PREFIXES = (
+    'http://publications.europa.eu/resource/authority/',
+    'https://publications.europa.eu/resource/authority/',
+    'http://publications.europa.eu/resource/dataset/',
+    'http://data.europa.eu/eli/',
+    'http://inspire.ec.europa.eu/theme/',
+    DATOSGOBES_THEME_PREFIX,
+    'http://datos.gob.es/recurso/sector-publico/territorio/',
+    'http://datos.gob.es/recurso/sector-publico/org/Organismo/',
+    FORMAT_PREFIX_EDP_IANA,
+)
 
 # Constants for schema fields choices
 NTI_CHOICES_FIELD_LANGUAGE = 'language'
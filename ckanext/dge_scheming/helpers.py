@@ -17,33 +17,253 @@
 
 import re
 import json
-from ckanext.scheming.helpers import lang
+import datetime
+from dateutil.parser import parse as parse_date
+from ckanext.scheming.helpers import lang, scheming_language_text
 import ckan.lib.helpers as h
-from ckan.plugins.toolkit import (config, _)
+import ckan.plugins.toolkit as toolkit
+from ckan.plugins.toolkit import (config, _, get_action)
 import urllib.request, urllib.parse, urllib.error
 import urllib.parse
-import rfc3987
 
+import ckan.authz as authz
 import ckan.model as model
-import ckan.lib.dictization.model_dictize as model_dictize
+import sqlalchemy as sa
 import ckanext.dge_scheming.constants as ds_constants
+import ckanext.dge_scheming.model as ds_model
+import ckanext.dge_scheming.vocabulary as ds_vocabulary
+from ckanext.dge_scheming.cache import LRUCache
 
 
 import logging
 log = logging.getLogger(__name__)
 
+_uri_validity_cache = LRUCache('uri_validity', ds_constants.URI_CACHE_DEFAULT_SIZE)
+_organization_cache = LRUCache(
+    'organization', ds_constants.ORGANIZATION_CACHE_DEFAULT_SIZE,
+    ds_constants.ORGANIZATION_CACHE_DEFAULT_TTL)
+_organization_list_cache = LRUCache(
+    'organization_list', 1, ds_constants.ORGANIZATION_CACHE_DEFAULT_TTL)
+
 
 def dge_dataset_form_organization_list():
     """
-    Get a list of all active organizations
+    Get a list of all active organizations as dicts with only their
+    'id' and 'display_name', sorted by display name.
+    The list is cached and invalidated when an organization is created,
+    updated or deleted.
     """
-    context = {'model': model}
-    orgs_q = model.Session.query(model.Group) \
+    orgs_list = _organization_list_cache.get('active')
+    if orgs_list is None:
+        orgs_q = model.Session.query(
+                model.Group.id, model.Group.name, model.Group.title) \
+            .filter(model.Group.is_organization == True) \
+            .filter(model.Group.state == 'active')
+        orgs_list = [{'id': org_id, 'display_name': title or name}
+                     for org_id, name, title in orgs_q]
+        orgs_list.sort(key=lambda org: h.strxfrm(org['display_name']))
+        _organization_list_cache.set('active', orgs_list)
+    return orgs_list
+
+def dge_organization_autocomplete(field):
+    '''
+    :param field: scheming field dict of the organization selector
+
+    Return True if the organization selector has to load its options on
+    demand (field 'organization_autocomplete' or
+    ckanext.dge-scheming.organization_autocomplete) instead of rendering
+    every organization
+    '''
+    if field and 'organization_autocomplete' in field:
+        return toolkit.asbool(field['organization_autocomplete'])
+    return toolkit.asbool(config.get(
+        ds_constants.ORGANIZATION_AUTOCOMPLETE_CONFIG, False))
+
+def dge_search_organizations(q=None, page=1, limit=None, language=None,
+                             organization_ids=None):
+    '''
+    :param q: text searched, case insensitive, in the organization name
+        and title. Organizations starting with it are returned first
+    :param page: page number, starting at 1
+    :param limit: organizations per page, at most
+        ds_constants.ORGANIZATION_SEARCH_MAX_LIMIT
+    :param language: language of the display names, current one if None
+    :param organization_ids: only search these organizations, all of them
+        if None (see dge_organization_ids_for_user)
+
+    Return a dict with the number of matching active organizations
+    ('count') and the requested page ('results') as dicts with their 'id',
+    'name' and 'display_name'
+    '''
+    limit = min(max(limit or ds_constants.ORGANIZATION_SEARCH_DEFAULT_LIMIT, 1),
+                ds_constants.ORGANIZATION_SEARCH_MAX_LIMIT)
+    page = max(page or 1, 1)
+    display_name = sa.func.coalesce(
+        sa.func.nullif(model.Group.title, ''), model.Group.name)
+    orgs_q = model.Session.query(
+            model.Group.id, model.Group.name, display_name) \
         .filter(model.Group.is_organization == True) \
         .filter(model.Group.state == 'active')
+    if organization_ids is not None:
+        if not organization_ids:
+            return {'count': 0, 'page': page, 'limit': limit, 'results': []}
+        orgs_q = orgs_q.filter(model.Group.id.in_(organization_ids))
+    order_by = [sa.func.lower(display_name), model.Group.name]
+    q = (q or '').strip()
+    if q:
+        pattern = q.replace('\\', '\\\\').replace('%', '\\%') \
+            .replace('_', '\\_')
+        orgs_q = orgs_q.filter(sa.or_(
+            model.Group.name.ilike('%' + pattern + '%', escape='\\'),
+            model.Group.title.ilike('%' + pattern + '%', escape='\\')))
+        order_by.insert(0, sa.case(
+            [(display_name.ilike(pattern + '%', escape='\\'), 0)], else_=1))
+    count = orgs_q.count()
+    rows = orgs_q.order_by(*order_by) \
+        .offset((page - 1) * limit).limit(limit).all()
+    translated = _dge_translated_organization_titles(
+        [row[0] for row in rows], language or lang())
+    results = [{'id': org_id,
+                'name': name,
+                'display_name': translated.get(org_id) or title}
+               for org_id, name, title in rows]
+    return {'count': count, 'page': page, 'limit': limit, 'results': results}
 
-    orgs_list = model_dictize.group_list_dictize(orgs_q.all(), context)
-    return orgs_list
+def dge_organization_ids_for_user(permission, user=None):
+    '''
+    :param permission: permission the user needs in the organizations
+        (e.g. 'create_dataset')
+    :param user: user name, the current one by default
+
+    Return the ids of the organizations where the user has the permission,
+    or None for sysadmins, who have it in all of them
+    '''
+    if user is None:
+        user = toolkit.c.user
+    if authz.is_sysadmin(user):
+        return None
+    organizations = get_action('organization_list_for_user')(
+        {'model': model, 'user': user},
+        {'permission': permission, 'include_dataset_count': False})
+    return [organization['id'] for organization in organizations]
+
+def dge_get_default_organization_option(permission='create_dataset',
+                                        language=None):
+    '''
+    :param permission: permission the current user needs in the organization
+    :param language: language of the display name, current one if None
+
+    Return a dict with the 'id' and 'display_name' of the first
+    organization, by display name, where the current user has the
+    permission, the one preselected for new datasets. None if there is none
+    '''
+    results = dge_search_organizations(
+        limit=1, language=language,
+        organization_ids=dge_organization_ids_for_user(permission))['results']
+    if not results:
+        return None
+    return {'id': results[0]['id'],
+            'display_name': results[0]['display_name']}
+
+def dge_get_organization_option(identifier, language=None):
+    '''
+    :param identifier: organization id or name
+    :param language: language of the display name, current one if None
+
+    Return a dict with the 'id' and 'display_name' of the organization,
+    None if it does not exist
+    '''
+    if not identifier:
+        return None
+    group = model.Group.get(identifier)
+    if not group or not group.is_organization:
+        return None
+    translated = _dge_translated_organization_titles(
+        [group.id], language or lang())
+    return {'id': group.id,
+            'display_name': translated.get(group.id) or group.display_name}
+
+def _dge_translated_organization_titles(group_ids, language):
+    '''
+    Return {group id: title in language} for the given organizations with
+    a title_translated extra
+    '''
+    titles = {}
+    if not group_ids or not language:
+        return titles
+    extras_q = model.Session.query(
+            model.GroupExtra.group_id, model.GroupExtra.value) \
+        .filter(model.GroupExtra.group_id.in_(group_ids)) \
+        .filter(model.GroupExtra.key ==
+                ds_constants.ORGANIZATION_TITLE_TRANSLATED_KEY) \
+        .filter(model.GroupExtra.state == 'active')
+    for group_id, value in extras_q:
+        try:
+            title = json.loads(value).get(language)
+        except (ValueError, TypeError, AttributeError):
+            continue
+        if title:
+            titles[group_id] = title
+    return titles
+
+def dge_get_organization_info(identifier):
+    '''
+    :param identifier: organization id or name
+
+    Return a dict with the group id of the organization ('group_id', None
+    if there is no such group), the organization id ('id', None if it was
+    not found) and its active extras ('extras', {key: value}).
+    Results, also the not found ones, are cached by identifier for
+    ckanext.dge-scheming.organization_cache_ttl seconds and invalidated
+    when the organization is created, updated or deleted in this process.
+    '''
+    info = _organization_cache.get(identifier)
+    if info is None:
+        info = _dge_load_organization_info(identifier)
+        _organization_cache.set(identifier, info)
+    return info
+
+def _dge_load_organization_info(identifier):
+    group = model.Group.get(identifier)
+    if group is None:
+        return {'group_id': None, 'id': None, 'extras': {}}
+    organization = h.get_organization(group.id)
+    if not organization:
+        organization = get_action('dge_organization_publisher')(
+            {'model': model}, {'id': group.id})
+    extras = {}
+    if organization and organization.get('extras'):
+        for extra in organization['extras']:
+            if extra.get('state') == 'active':
+                extras[extra['key']] = extra['value']
+    return {
+        'group_id': group.id,
+        'id': organization.get('id') if organization else None,
+        'extras': extras,
+    }
+
+def dge_invalidate_organization_cache(group):
+    '''
+    :param group: organization model object
+
+    Remove the cached information of the organization, also the one cached
+    by a previous name, and the not found entry of its current name
+    '''
+    if group.name:
+        _organization_cache.delete(group.name)
+    _organization_cache.delete_matching(
+        lambda info: info['group_id'] == group.id)
+    _organization_list_cache.clear()
+
+def dge_configure_organization_cache(maxsize, ttl):
+    '''
+    :param maxsize: maximum number of cached organizations. 0 disables the cache
+    :param ttl: seconds an organization is kept in the cache
+
+    Set the size and TTL of the organization cache
+    '''
+    _organization_cache.configure(maxsize, ttl)
+    _organization_list_cache.configure(1 if maxsize > 0 else 0, ttl)
 
 def dge_dataset_form_value(text):
     """
@@ -124,10 +344,9 @@ def dge_is_url(value):
     A complete URI starts with scheme_name: ([A-Za-z][A-Za-z0-9+.-]*):
     Returns True if argument parses as a http, https or ftp URL
     '''
-    if not dge_is_uri(value):
-        return False
-    else:
+    if dge_is_known_vocabulary_uri(value):
         return h.is_url(value)
+    return _dge_cached_validity(ds_constants.URI_CACHE_RULE_URL, _dge_is_url, value)
 
 
 def dge_is_uri(value):
@@ -136,12 +355,102 @@ def dge_is_uri(value):
     URI.
     A complete URI starts with scheme_name: ([A-Za-z][A-Za-z0-9+.-]*):
     '''
+    if dge_is_known_vocabulary_uri(value):
+        return True
+    return _dge_cached_validity(ds_constants.URI_CACHE_RULE_URI, _dge_is_uri, value)
+
+
+def dge_is_known_vocabulary_uri(value):
+    '''
+    :param value: URI
+
+    Return True if value starts with one of the known vocabulary prefixes
+    (ds_constants.KNOWN_VOCABULARY_URI_PREFIXES). False otherwise.
+    The scheme and host of those prefixes are valid, so these URIs do not
+    need the generic URI grammar.
+    '''
+    if not isinstance(value, str):
+        return False
+    prefixes = _known_vocabulary_uri_prefixes.get(_dge_uri_authority(value))
+    return bool(prefixes) and value.startswith(prefixes)
+
+
+def _dge_uri_authority(value):
+    '''
+    Return the "scheme://host/" head of value or None if it has no path
+    '''
+    start = value.find('://')
+    if start <= 0:
+        return None
+    end = value.find('/', start + 3)
+    if end < 0:
+        return None
+    return value[:end + 1]
+
+
+def _dge_build_uri_prefix_index(prefixes):
+    '''
+    Group prefixes by their "scheme://host/" head, so a URI is only
+    compared with the prefixes of its own host
+    '''
+    index = {}
+    for prefix in prefixes:
+        index.setdefault(_dge_uri_authority(prefix), []).append(prefix)
+    return dict((authority, tuple(values)) for authority, values in index.items())
+
+_known_vocabulary_uri_prefixes = _dge_build_uri_prefix_index(
+    ds_constants.KNOWN_VOCABULARY_URI_PREFIXES)
+
+
+def dge_uri_cache_info():
+    '''
+    Return a dict with size, maxsize, hits and misses of the URI/URL
+    validity cache
+    '''
+    return _uri_validity_cache.info()
+
+
+def dge_configure_uri_cache(maxsize):
+    '''
+    :param maxsize: maximum number of cached values. 0 disables the cache
+
+    Set the maximum size of the URI/URL validity cache
+    '''
+    _uri_validity_cache.configure(maxsize)
+
+
+def _dge_cached_validity(rule, check, value):
+    '''
+    Memoize check(value) keyed by rule and the raw string value.
+    Harvests send the same vocabulary URIs again and again.
+    '''
+    if not isinstance(value, str):
+        return check(value)
+    cache_key = (rule, value)
+    result = _uri_validity_cache.get(cache_key)
+    if result is None:
+        result = check(value)
+        _uri_validity_cache.set(cache_key, result)
+    return result
+
+
+def _dge_is_url(value):
+    if not _dge_is_uri(value):
+        return False
+    else:
+        return h.is_url(value)
+
+
+def _dge_is_uri(value):
     if not value or value.strip() == '':
         return False
+    # scheme://host[:port] with a plain host is always a valid URI
+    if _simple_uri_head_re.match(value):
+        return True
     try:
         url = urllib.parse.urlparse(value)
     except ValueError as e:
-        log.info('%s is not a valid URI. Value error %s.' % e)
+        log.info('%s is not a valid URI. Value error %s.' % (value, e))
         return False
     netloc = url.netloc
     if h.is_url(value) and not(netloc and len(netloc) > 0):
@@ -155,14 +464,53 @@ def dge_is_uri(value):
     url2 = netloc
     if url.scheme and len(url.scheme) > 0:
         url2 = url.scheme + '://' + netloc
-    #log.info('************* url2= %s' % url2)
-    if rfc3987.match(url2, rule='URI'):
+    if _uri_re.match(url2):
         return True
     else:
-        log.info('% s is not a valid URI.')
+        log.info('%s is not a valid URI.' % value)
         return False
 
 
+def _dge_build_uri_re():
+    '''
+    Compile the RFC 3986 "URI" rule, accepting the same strings as
+    rfc3987.match(value, rule='URI')
+    '''
+    pct_encoded = '%[0-9A-Fa-f]{2}'
+    pchar = "(?:[a-zA-Z0-9_.~!$&'()*+,;=:@-]|%s)" % pct_encoded
+    query = "(?:[a-zA-Z0-9_.~!$&'()*+,;=:@/?-]|%s)*" % pct_encoded
+    userinfo = "(?:[a-zA-Z0-9_.~!$&'()*+,;=:-]|%s)*" % pct_encoded
+    # IPv4address is a subset of reg-name
+    reg_name = "(?:[a-zA-Z0-9_.~!$&'()*+,;=-]|%s)*" % pct_encoded
+    h16 = '[0-9A-Fa-f]{1,4}'
+    dec_octet = '(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)'
+    ls32 = r'(?:{h16}:{h16}|(?:{dec_octet}\.){{3}}{dec_octet})'.format(
+        h16=h16, dec_octet=dec_octet)
+    ipv6 = '|'.join(template.format(h16=h16, ls32=ls32) for template in (
+        '(?:{h16}:){{6}}{ls32}',
+        '::(?:{h16}:){{5}}{ls32}',
+        '(?:{h16})?::(?:{h16}:){{4}}{ls32}',
+        '(?:(?:{h16}:)?{h16})?::(?:{h16}:){{3}}{ls32}',
+        '(?:(?:{h16}:){{,2}}{h16})?::(?:{h16}:){{2}}{ls32}',
+        '(?:(?:{h16}:){{,3}}{h16})?::(?:{h16}:){ls32}',
+        '(?:(?:{h16}:){{,4}}{h16})?::{ls32}',
+        '(?:(?:{h16}:){{,5}}{h16})?::{h16}',
+        '(?:(?:{h16}:){{,6}}{h16})?::',
+    ))
+    ipvfuture = r"v[0-9A-Fa-f]+\.[a-zA-Z0-9_.~!$&'()*+,;=:-]+"
+    host = r'(?:\[(?:%s|%s)\]|%s)' % (ipv6, ipvfuture, reg_name)
+    authority = '(?:%s@)?%s(?::[0-9]*)?' % (userinfo, host)
+    # "//" authority path-abempty, or path-absolute / path-rootless / path-empty
+    hier_part = '(?://{authority}(?:/{pchar}*)*|/?(?:{pchar}+(?:/{pchar}*)*)?)'.format(
+        authority=authority, pchar=pchar)
+    return re.compile(r'^[a-zA-Z][a-zA-Z0-9+.-]*:%s(?:\?%s)?(?:\#%s)?$' % (
+        hier_part, query, query))
+
+_uri_re = _dge_build_uri_re()
+_simple_uri_head_re = re.compile(
+    r'[a-zA-Z][a-zA-Z0-9+.-]*://[a-zA-Z0-9.-]+(?::[0-9]*)?(?:[/?#]|\Z)')
+
+
 def dge_multiple_field_required(field, lang):
     """
     Return field['required'] or guess based on validators if not present.
@@ -190,30 +538,180 @@ def dge_dataset_license_to_distributions_license(context, data_dict):
     '''
     Update resource_license when a dataset is updated
     In DCAT-AP-ES 1.0.0 dataset's dct:license will be stored in every dataset's distribution dct:license
+
+    Active resources with a resource_license different from the dataset
+    license are updated with a single statement in the current transaction.
+    Datasets with more resources than
+    ckanext.dge-scheming.license_job_threshold are updated by a background
+    job instead.
+    Return the number of updated resources
     '''
-    from sqlalchemy.orm.attributes import flag_modified
     log.debug('[dge_dataset_license_to_distributions_license]')
-    if 'state' not in data_dict:
-        model = context['model']
-        package = model.Package.get(data_dict['id'])
-        for resource in package.resources:
-            if 'resource_license' in resource.extras and 'license_id' in data_dict:
-                if resource.extras['resource_license'] != data_dict['license_id']:
-                    resource.extras['resource_license'] = data_dict['license_id']
-                    flag_modified(resource, 'extras')
-                    try:
-                        model.Session.commit()
-                    except Exception as e:
-                        log.debug(f'There was an error updating data in resources: {e}')
-                        model.Session.rollback()
-                        
+    if 'state' in data_dict or 'license_id' not in data_dict:
+        return 0
+    model = context['model']
+    package_id = data_dict['id']
+    license_id = data_dict['license_id']
+
+    threshold = _license_propagation['job_threshold']
+    if threshold > 0:
+        resources = data_dict.get('resources')
+        num_resources = len(resources) if resources is not None else \
+            model.Session.query(model.Resource) \
+                .filter(model.Resource.package_id == package_id) \
+                .filter(model.Resource.state == 'active').count()
+        if num_resources > threshold:
+            from ckanext.dge_scheming.jobs import propagate_dataset_license
+            dge_enqueue_job_after_commit(
+                propagate_dataset_license,
+                [package_id, license_id, _license_propagation['chunk_size']],
+                'dge_scheming license propagation {}'.format(package_id))
+            log.debug('[dge_dataset_license_to_distributions_license] '
+                      'package_id=%s resources=%s queued', package_id,
+                      num_resources)
+            return 0
+
+    # Pending ORM changes have to reach the resource rows before updating them
+    model.Session.flush()
+    updated = dge_update_distributions_license(package_id, license_id)
+    if updated:
+        # Loaded resources would keep and index the previous extras
+        for obj in list(model.Session.identity_map.values()):
+            if isinstance(obj, model.Resource) and obj.package_id == package_id:
+                model.Session.expire(obj, ['extras'])
+    log.debug('[dge_dataset_license_to_distributions_license] '
+              'package_id=%s updated=%s', package_id, updated)
+    return updated
+
+def dge_enqueue_job_after_commit(fn, args, title):
+    '''
+    :param fn: job function
+    :param args: job arguments
+    :param title: job title
+
+    Enqueue the background job when the current transaction is committed,
+    so the worker reads the committed data. The job is dropped if the
+    transaction is rolled back. If it can not be enqueued (e.g. Redis is
+    down) the commit is kept and the error is logged with the job function
+    and arguments, so it can be run again by hand
+    '''
+    model.Session.info.setdefault(
+        ds_constants.PENDING_JOBS_SESSION_KEY, []).append((fn, args, title))
+
+@sa.event.listens_for(model.Session, 'after_commit')
+def _dge_enqueue_pending_jobs(session):
+    for fn, args, title in session.info.pop(
+            ds_constants.PENDING_JOBS_SESSION_KEY, []):
+        try:
+            toolkit.enqueue_job(fn, args, title=title)
+        except Exception:
+            # The transaction is already committed, raising here would
+            # only hide it from the caller
+            log.exception('[dge_enqueue_job_after_commit] Could not enqueue '
+                          '"%s", run it again with %s.%s(*%r)', title,
+                          fn.__module__, fn.__name__, args)
+
+@sa.event.listens_for(model.Session, 'after_rollback')
+def _dge_discard_pending_jobs(session):
+    session.info.pop(ds_constants.PENDING_JOBS_SESSION_KEY, None)
+
+def dge_update_distributions_license(package_id, license_id, limit=None):
+    '''
+    :param package_id: dataset id
+    :param license_id: license to set in the resource_license of its resources
+    :param limit: maximum number of resources updated, all if None
+
+    Set resource_license in the active resources of the dataset that have
+    a different one, in the current transaction.
+    Return the number of updated resources
+    '''
+    result = model.Session.execute(_resource_license_update, {
+        'package_id': package_id,
+        'license': license_id,
+        'limit': limit,
+    })
+    return result.rowcount
+
+def dge_configure_license_propagation(job_threshold, chunk_size):
+    '''
+    :param job_threshold: number of resources above which the license is
+        propagated by a background job. 0 always propagates it in the request
+    :param chunk_size: resources updated per transaction by the job
+    '''
+    _license_propagation['job_threshold'] = job_threshold
+    _license_propagation['chunk_size'] = chunk_size
+
+_license_propagation = {
+    'job_threshold': ds_constants.LICENSE_JOB_DEFAULT_THRESHOLD,
+    'chunk_size': ds_constants.LICENSE_JOB_DEFAULT_CHUNK_SIZE,
+}
+
+# LIMIT NULL updates every matching resource
+_resource_license_update = sa.text('''
+    UPDATE resource
+    SET extras = jsonb_set(
+        extras::jsonb, '{resource_license}',
+        COALESCE(to_jsonb(CAST(:license AS text)), 'null'::jsonb))::text
+    WHERE id IN (
+        SELECT id FROM resource
+        WHERE package_id = :package_id
+        AND state = 'active'
+        AND extras IS NOT NULL AND extras <> ''
+        AND jsonb_exists(extras::jsonb, 'resource_license')
+        AND extras::jsonb -> 'resource_license'
+            IS DISTINCT FROM COALESCE(to_jsonb(CAST(:license AS text)), 'null'::jsonb)
+        ORDER BY id
+        LIMIT :limit)
+''')
+
 def dge_get_nti_field_choices(field):
     '''
     :param field: Schema choice field
     
-    Return a list of dicts with datos.gob.es NTI-RISP choices for the field specified
+    Return a list of dicts with datos.gob.es NTI-RISP choices for the field specified.
+    The list is new on every call, the dicts are shared and read-only
+    '''
+    return list(ds_vocabulary.get_vocabulary(field).choices)
+
+def dge_get_localized_choices(field, language=None):
     '''
-    return ds_constants.NTI_CHOICES_FIELDS[field]
+    :param field: Schema choice field (language, spatial, theme or frequency)
+    :param language: language of the labels, current language by default
+
+    Return a tuple of (value, label) with the datos.gob.es NTI-RISP choices
+    of the field, ready to render in a select. The labels are resolved with
+    scheming_language_text once per process and language.
+    '''
+    if not language:
+        language = lang()
+    choices = _localized_choices.get((field, language))
+    if choices is None:
+        choices = tuple(
+            (choice['value'], scheming_language_text(choice['label'], language))
+            for choice in ds_vocabulary.get_vocabulary(field))
+        _localized_choices[(field, language)] = choices
+    return choices
+
+_localized_choices = {}
+
+def dge_get_vocabulary_label(field, value, language=None):
+    '''
+    :param field: Schema choice field (language, spatial, theme or frequency)
+    :param value: choice value
+    :param language: language of the label, current language by default
+
+    Return the label of value in the datos.gob.es NTI-RISP choices of the
+    field, in the default locale if there is none in language, or None if
+    value is not a choice of the field
+    '''
+    if not language:
+        try:
+            language = lang()
+        except RuntimeError:
+            # Outside of a request
+            language = None
+    return ds_vocabulary.get_vocabulary(field).label(
+        value, language, config.get('ckan.locale_default', 'es'))
 
 def dge_get_application_profile(dataset_dict):
     '''
@@ -222,13 +720,193 @@ def dge_get_application_profile(dataset_dict):
     Return a str with the value of dataset application profile
     '''
     application_profile = None
-    for data_key in dataset_dict:
-        if len(data_key) == 3 and dataset_dict[data_key] == ds_constants.APPLICATION_PROFILE_KEY:
-            data_key_index = data_key[1]
-            data_profile_value_key = ('extras', data_key_index, 'value')
-            application_profile = dataset_dict[data_profile_value_key]
+    for index, extra_key in _dge_flattened_extras(dataset_dict):
+        if extra_key == ds_constants.APPLICATION_PROFILE_KEY:
+            application_profile = dataset_dict.get(
+                (ds_constants.EXTRAS, index, ds_constants.VALUE))
     return application_profile
 
+def _dge_flattened_extras(dataset_dict):
+    '''
+    :param dataset_dict: flattened dataset dict
+
+    Yield (index, key) for every ('extras', index, 'key') item.
+    Flattened lists are numbered from 0 without gaps, so extras are probed
+    by index instead of scanning the whole dict, which also holds every
+    resource field.
+    '''
+    index = 0
+    extra_key = (ds_constants.EXTRAS, index, ds_constants.KEY)
+    while extra_key in dataset_dict:
+        yield index, dataset_dict[extra_key]
+        index += 1
+        extra_key = (ds_constants.EXTRAS, index, ds_constants.KEY)
+
+class DgePackageProfile(object):
+    '''
+    Application profile information of a flattened dataset dict:
+    harvested (with guid) or manual, NTI-RISP or DCAT-AP-ES 1.0.0.
+    '''
+    def __init__(self, dataset_dict):
+        self._dataset_dict = dataset_dict
+        self._has_resources = None
+        self.has_guid = False
+        self.application_profile = None
+        for index, extra_key in _dge_flattened_extras(dataset_dict):
+            if extra_key == ds_constants.GUID_KEY:
+                self.has_guid = True
+            elif extra_key == ds_constants.APPLICATION_PROFILE_KEY:
+                self.application_profile = dataset_dict.get(
+                    (ds_constants.EXTRAS, index, ds_constants.VALUE))
+
+    @property
+    def is_harvested(self):
+        return self.has_guid
+
+    @property
+    def is_manual(self):
+        return not self.has_guid
+
+    @property
+    def is_nti(self):
+        return self.application_profile == ds_constants.NTI
+
+    @property
+    def is_dcatapes(self):
+        return self.application_profile == ds_constants.DCATAPES_100
+
+    @property
+    def has_resources(self):
+        '''
+        True if the dataset dict has any ('resources', index, field) key.
+        Computed on first use.
+        '''
+        if self._has_resources is None:
+            self._has_resources = any(
+                key[0] == ds_constants.RESOURCES
+                for key in self._dataset_dict if key)
+        return self._has_resources
+
+def dge_get_package_profile(dataset_dict, context=None):
+    '''
+    :param dataset_dict: flattened dataset dict being validated
+    :param context: navl validation context
+
+    Return the DgePackageProfile of dataset_dict. It is computed once per
+    validation run and cached in the context, so every validator of the
+    package reads the same object instead of scanning the extras again.
+    '''
+    if context is None:
+        return DgePackageProfile(dataset_dict)
+    cached = context.get(ds_constants.PACKAGE_PROFILE_CONTEXT_KEY)
+    if cached and cached[0] is dataset_dict:
+        return cached[1]
+    profile = DgePackageProfile(dataset_dict)
+    context[ds_constants.PACKAGE_PROFILE_CONTEXT_KEY] = (dataset_dict, profile)
+    return profile
+
+def dge_get_extras_by_prefix(data, level, prefix, context=None):
+    '''
+    :param data: flattened dict being validated
+    :param level: key of the dict holding the __extras, () for the dataset
+    :param prefix: start of the names looked for, ending in '-'
+        (e.g. 'title_translated-')
+    :param context: navl validation context
+
+    Return a list of (name, value) of the __extras whose name starts with
+    prefix, in __extras order. The __extras are indexed by every prefix
+    ending in '-' once per validation and the index is shared through the
+    context, so form-field validators do not scan all of them.
+    '''
+    extras = data.get(level + ('__extras',))
+    if not extras:
+        return []
+    if context is None:
+        return _dge_index_extras(extras).get(prefix, [])
+    indexes = context.setdefault(ds_constants.EXTRAS_INDEX_CONTEXT_KEY, {})
+    cached = indexes.get(level)
+    if not cached or cached[0] is not extras or cached[1] != len(extras):
+        cached = (extras, len(extras), _dge_index_extras(extras))
+        indexes[level] = cached
+    return cached[2].get(prefix, [])
+
+def dge_reset_extras_index(level, context):
+    '''
+    Drop the index of the __extras of level, to be called after removing
+    or changing any of them
+    '''
+    context.get(ds_constants.EXTRAS_INDEX_CONTEXT_KEY, {}).pop(level, None)
+
+def _dge_index_extras(extras):
+    index = {}
+    for name, value in extras.items():
+        if not isinstance(name, str):
+            continue
+        position = name.find('-')
+        while position >= 0:
+            index.setdefault(name[:position + 1], []).append((name, value))
+            position = name.find('-', position + 1)
+    return index
+
+class DgeJsonText(str):
+    '''
+    JSON text of a field value that keeps the value it encodes, so the
+    next validators of this extension in the field chain read it without
+    decoding it again (validators of other extensions, like fluent_text,
+    still decode the text). It is stored as the plain JSON text. Every read
+    of value returns a new copy, so changing it does not make the cached
+    value and the text differ.
+    '''
+
+    def __new__(cls, text, value):
+        obj = str.__new__(cls, text)
+        obj._value = _dge_copy_json_value(value)
+        return obj
+
+    @property
+    def value(self):
+        return _dge_copy_json_value(self._value)
+
+    def __reduce__(self):
+        # The validated package dict is deep copied and pickled by other
+        # plugins and background jobs
+        return (type(self), (str(self), self._value))
+
+def _dge_copy_json_value(value):
+    # Faster than copy.deepcopy for the lists and dicts of str decoded
+    # from JSON
+    if isinstance(value, list):
+        return [_dge_copy_json_value(item) for item in value]
+    if isinstance(value, dict):
+        return dict((k, _dge_copy_json_value(v)) for k, v in value.items())
+    return value
+
+def dge_json_text(value):
+    '''
+    :param value: value to store in JSON
+
+    Serialize value, keeping it decoded for the next validators
+    '''
+    return DgeJsonText(json.dumps(value), value)
+
+def dge_decode_json_value(data, key):
+    '''
+    :param data: flattened dict being validated
+    :param key: key of the field value
+
+    Return the field value, decoded from JSON when it is a str. The
+    decoded value is kept in data[key] along with its JSON text, so a
+    value is decoded once in the chain of validators of its field.
+    Raises ValueError when the value is not valid JSON.
+    '''
+    value = data[key]
+    if isinstance(value, DgeJsonText):
+        return value.value
+    if isinstance(value, str):
+        data[key] = DgeJsonText(value, json.loads(value))
+        return data[key].value
+    return value
+
 def dge_package_dict_has_guid(package_dict):
     '''
     :param package_dict: package dict
@@ -264,11 +942,25 @@ def _dge_package_dict(package):
         ]
     }
 
-def dge_sync_served_by_dataservice_for_manual_package(package):
+def dge_sync_served_by_dataservice_for_manual_package(package, context=None,
+                                                     data_dict=None):
     '''
-    Recalculate dataset served_by_dataservice from package resources.
-    Only applies to manual datasets.
+    :param package: package model object
+    :param context: context of the package_update, with the changes recorded
+        by dge_record_resource_access_services when it comes from a
+        resource action
+    :param data_dict: validated package dict of the package_update
+
+    Keep dataset served_by_dataservice in sync with the access_service of
+    its resources. Only applies to manual datasets.
+    Resource actions apply their changes to the stored value, metadata only
+    updates keep it and updates that replace the resources recalculate it
+    from them.
     '''
+    # Pop the recorded changes first so they never leak to a later
+    # package_update sharing the context
+    changes = (context or {}).pop(
+        ds_constants.ACCESS_SERVICE_CHANGES_CONTEXT_KEY, None)
     if not package:
         return
     if getattr(package, 'type', None) != 'dataset':
@@ -276,16 +968,30 @@ def dge_sync_served_by_dataservice_for_manual_package(package):
     if not dge_is_manual_dataset(_dge_package_dict(package)):
         return
 
-    served_by_dataservice = []
-    for resource in package.resources:
-        access_service_values = resource.extras.get(
-            ds_constants.RESOURCE_ACCESS_SERVICE_KEY
-        )
-        for value in _json_list(access_service_values):
-            if value and value not in served_by_dataservice:
-                served_by_dataservice.append(value)
+    stored_value = package.extras.get(ds_constants.SERVED_BY_DATASERVICE_KEY)
 
-    recalculated_value = json.dumps(served_by_dataservice)
+    if stored_value is None:
+        served_by_dataservice = _dge_access_services(
+            resource.extras for resource in package.resources)
+    elif changes is not None:
+        served_by_dataservice = _dge_ordered_set(_json_list(stored_value))
+        for value in changes['added']:
+            served_by_dataservice.setdefault(value)
+        removed = [value for value in changes['removed']
+                   if value not in changes['added']]
+        if removed:
+            # Services removed from a resource may still be used by another one
+            in_use = _dge_access_services(
+                resource.extras for resource in package.resources)
+            for value in removed:
+                if value not in in_use:
+                    served_by_dataservice.pop(value, None)
+    elif data_dict is not None and data_dict.get('resources') is not None:
+        served_by_dataservice = _dge_access_services(data_dict['resources'])
+    else:
+        served_by_dataservice = _dge_ordered_set(_json_list(stored_value))
+
+    recalculated_value = json.dumps(list(served_by_dataservice))
 
     # To prevent package_update from deleting served_by_dataservice and keep
     # the derived value synchronized, force a real mutation on package.extras.
@@ -306,6 +1012,174 @@ def dge_sync_served_by_dataservice_for_manual_package(package):
         package.extras.get(ds_constants.SERVED_BY_DATASERVICE_KEY)
     )
 
+def dge_record_resource_access_services(context, current=None, resource=None):
+    '''
+    :param context: context of the resource action
+    :param current: resource dict before the action, None when creating it
+    :param resource: resource dict after the action, None when deleting it
+
+    Record in the context the access services added to and removed from
+    the resource, to be applied by
+    dge_sync_served_by_dataservice_for_manual_package in the package_update
+    run by the resource action
+    '''
+    changes = context.setdefault(
+        ds_constants.ACCESS_SERVICE_CHANGES_CONTEXT_KEY,
+        {'added': {}, 'removed': {}})
+    before = _dge_access_services([current] if current else [])
+    after = _dge_access_services([resource] if resource else [])
+    for value in after:
+        if value not in before:
+            changes['added'].setdefault(value)
+    for value in before:
+        if value not in after:
+            changes['removed'].setdefault(value)
+
+def dge_index_dataservice_references(data_dict):
+    '''
+    :param data_dict: validated package dict of a package_create or
+        package_update
+
+    Rewrite the reverse index from data services to the resources of the
+    package that use them in their access_service. Nothing is done if the
+    dict has no resources, as they have not changed
+    '''
+    resources = data_dict.get('resources')
+    if resources is None or not data_dict.get('id'):
+        return
+    ds_model.update_dataservice_references(data_dict['id'], dict(
+        (resource['id'], list(_dge_access_services([resource])))
+        for resource in resources if resource.get('id')))
+
+def _dge_access_services(resources):
+    '''
+    :param resources: iterable of resource dicts or resource extras
+
+    Return an ordered set (dict with None values) of the access_service
+    values of the resources
+    '''
+    access_services = {}
+    for resource in resources:
+        for value in _json_list(
+                resource.get(ds_constants.RESOURCE_ACCESS_SERVICE_KEY)):
+            if value and isinstance(value, str):
+                access_services.setdefault(value)
+    return access_services
+
+def _dge_ordered_set(values):
+    return dict.fromkeys(
+        value for value in values if value and isinstance(value, str))
+
+def dge_index_vocabulary_fields(pkg_dict):
+    '''
+    :param pkg_dict: package dict being indexed
+
+    Add to pkg_dict the values of the composite scheming fields stored as
+    JSON (theme, spatial, language, frequency and temporal coverage) as
+    multivalued string fields and dates, so they are faceted and filtered
+    by term or range instead of matching the JSON text:
+
+    - vocab_dge_theme: theme URIs
+    - vocab_dge_theme_dcat_ap: DCAT-AP data themes, mapped from the
+      datos.gob.es themes or harvested as such
+    - vocab_dge_spatial: territories with their ancestors
+    - vocab_dge_language: language URIs
+    - vocab_dge_frequency: frequency identifier
+    - dge_temporal_start_date, dge_temporal_end_date: earliest start and
+      latest end of the temporal coverage periods
+    '''
+    themes = [uri for uri in _json_list(
+        pkg_dict.get(ds_constants.NTI_CHOICES_FIELD_THEME))
+        if uri and isinstance(uri, str)]
+    if themes:
+        pkg_dict[ds_constants.THEME_INDEX_FIELD] = themes
+        dcat_ap = {}
+        for uri in themes:
+            theme = ds_vocabulary.THEMES.get(uri)
+            if theme and theme.get('dcat_ap'):
+                dcat_ap[theme['dcat_ap']] = None
+            elif uri.startswith(ds_constants.DCAT_AP_THEME_PREFIX):
+                dcat_ap[uri] = None
+        if dcat_ap:
+            pkg_dict[ds_constants.THEME_DCAT_AP_INDEX_FIELD] = list(dcat_ap)
+
+    dge_index_spatial_closure(pkg_dict)
+
+    languages = [uri for uri in _json_list(
+        pkg_dict.get(ds_constants.NTI_CHOICES_FIELD_LANGUAGE))
+        if uri and isinstance(uri, str)]
+    if languages:
+        pkg_dict[ds_constants.LANGUAGE_INDEX_FIELD] = languages
+
+    frequency = _json_dict(pkg_dict.get(ds_constants.NTI_CHOICES_FIELD_FREQUENCY))
+    if frequency.get('identifier'):
+        pkg_dict[ds_constants.FREQUENCY_INDEX_FIELD] = [frequency['identifier']]
+
+    starts = []
+    ends = []
+    for period in _json_dict(pkg_dict.get(ds_constants.TEMPORAL_KEY)).values():
+        if not isinstance(period, dict):
+            continue
+        start = _dge_index_date(period.get('from'), _period_start)
+        end = _dge_index_date(period.get('to'), _period_end)
+        if start:
+            starts.append(start)
+        if end:
+            ends.append(end)
+    if starts:
+        pkg_dict[ds_constants.TEMPORAL_START_INDEX_FIELD] = min(starts)
+    if ends:
+        pkg_dict[ds_constants.TEMPORAL_END_INDEX_FIELD] = max(ends)
+    return pkg_dict
+
+_period_start = datetime.datetime(1, 1, 1)
+_period_end = datetime.datetime(1, 12, 31, 23, 59, 59)
+
+def _dge_index_date(value, default):
+    '''
+    Return value as a Solr UTC date, the missing parts of YYYY, YYYY-MM or
+    YYYY-MM-DD taken from default (start or end of the period), or None
+    '''
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        date = parse_date(value, default=default)
+    except (ValueError, OverflowError):
+        return None
+    if date.tzinfo:
+        date = date.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return date.replace(microsecond=0).isoformat() + 'Z'
+
+def dge_index_spatial_closure(pkg_dict):
+    '''
+    :param pkg_dict: package dict being indexed
+
+    Add to pkg_dict the territory URIs of spatial together with all their
+    ancestors (province -> autonomous community -> country) in the
+    multivalued SPATIAL_INDEX_FIELD, so a search or facet on a territory
+    also counts the datasets of the territories it contains.
+    '''
+    uris = []
+    for item in _json_list(pkg_dict.get(ds_constants.NTI_CHOICES_FIELD_SPATIAL)):
+        uri = item.get('uri') if isinstance(item, dict) else item
+        if uri and isinstance(uri, str):
+            uris.append(uri)
+    if uris:
+        pkg_dict[ds_constants.SPATIAL_INDEX_FIELD] = \
+            ds_vocabulary.get_spatial_closure(uris)
+    return pkg_dict
+
+def _json_dict(value):
+    if isinstance(value, dict):
+        return value
+    if value and isinstance(value, str):
+        try:
+            parsed = json.loads(value)
+        except ValueError:
+            return {}
+        return parsed if isinstance(parsed, dict) else {}
+    return {}
+
 def _json_list(value):
     if value in (None, ''):
         return []
@@ -327,15 +1201,9 @@ def dge_is_nti_application_profile(dataset_dict):
     :rtype: bool
     '''
     is_nti_application_profile = any(
-        dataset_dict.get((ds_constants.EXTRAS, key[1], ds_constants.VALUE)) == ds_constants.NTI
-        for key, value in dataset_dict.items()
-        if (
-            isinstance(key, tuple)
-            and len(key) == 3
-            and key[0] == ds_constants.EXTRAS
-            and key[2] == ds_constants.KEY
-            and value == ds_constants.APPLICATION_PROFILE_KEY
-        )
+        dataset_dict.get((ds_constants.EXTRAS, index, ds_constants.VALUE)) == ds_constants.NTI
+        for index, extra_key in _dge_flattened_extras(dataset_dict)
+        if extra_key == ds_constants.APPLICATION_PROFILE_KEY
     )
     return is_nti_application_profile
 
@@ -347,15 +1215,9 @@ def dge_is_dcatapes_application_profile(dataset_dict):
     :rtype: bool
     '''
     is_dcatapes_application_profile = any(
-        dataset_dict.get((ds_constants.EXTRAS, key[1], ds_constants.VALUE)) == ds_constants.DCATAPES_100
-        for key, value in dataset_dict.items()
-        if (
-            isinstance(key, tuple)
-            and len(key) == 3
-            and key[0] == ds_constants.EXTRAS
-            and key[2] == ds_constants.KEY
-            and value == ds_constants.APPLICATION_PROFILE_KEY
-        )
+        dataset_dict.get((ds_constants.EXTRAS, index, ds_constants.VALUE)) == ds_constants.DCATAPES_100
+        for index, extra_key in _dge_flattened_extras(dataset_dict)
+        if extra_key == ds_constants.APPLICATION_PROFILE_KEY
     )
     return is_dcatapes_application_profile
 
@@ -367,11 +1229,8 @@ def dge_has_guid(dataset_dict):
     :rtype: bool
     '''
     has_guid = any(
-        key[0] == ds_constants.EXTRAS
-        and key[2] == ds_constants.KEY
-        and value == ds_constants.GUID_KEY
-        for key, value in dataset_dict.items()
-        if isinstance(key, tuple) and len(key) == 3
+        extra_key == ds_constants.GUID_KEY
+        for index, extra_key in _dge_flattened_extras(dataset_dict)
     )
     return has_guid
 
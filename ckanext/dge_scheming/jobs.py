@@ -0,0 +1,117 @@
+# Copyright (C) 2026 Entidad Pública Empresarial Red.es
+#
+# This file is part of "dge-scheming (datos.gob.es)".
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import logging
+
+import ckan.model as model
+import ckan.lib.search as search
+from rq import get_current_job
+
+import ckanext.dge_scheming.constants as ds_constants
+import ckanext.dge_scheming.model as ds_model
+from ckanext.dge_scheming import helpers
+
+log = logging.getLogger(__name__)
+
+
+def propagate_dataset_license(package_id, license_id=None, chunk_size=None):
+    '''
+    Background job that sets the license of the dataset in the
+    resource_license of its active resources, committing every chunk_size
+    resources (all of them at once if it is None), and reindexes the
+    dataset.
+    The license is read from the committed dataset: license_id, the one it
+    was queued with, is only used to log a later change.
+    Only resources with a different value are updated, so running it again
+    is harmless and an interrupted run is completed by the next one.
+    Return the number of updated resources
+    '''
+    package = model.Package.get(package_id)
+    if not package or package.state != model.State.ACTIVE:
+        log.info('[propagate_dataset_license] package_id=%s not active',
+                 package_id)
+        return 0
+    if license_id is not None and package.license_id != license_id:
+        log.info('[propagate_dataset_license] package_id=%s license changed '
+                 'from %s to %s', package_id, license_id, package.license_id)
+    license_id = package.license_id
+    chunk_size = chunk_size if chunk_size and chunk_size > 0 else None
+    total = 0
+    while True:
+        try:
+            updated = helpers.dge_update_distributions_license(
+                package_id, license_id, chunk_size)
+            model.Session.commit()
+        except Exception:
+            model.Session.rollback()
+            raise
+        total += updated
+        if not chunk_size or updated < chunk_size:
+            break
+    if total:
+        search.rebuild(package_id, defer_commit=True)
+        search.commit()
+    log.info('[propagate_dataset_license] package_id=%s license=%s '
+             'updated=%s', package_id, license_id, total)
+    return total
+
+
+def replace_dataservice(old_uri, new_uri=None, chunk_size=None):
+    '''
+    Background job that replaces the data service old_uri with new_uri (or
+    removes it if new_uri is None) in the access_service of every resource
+    and the served_by_dataservice of every dataset that use it, found with
+    the dge_dataservice_reference index.
+    Every chunk of chunk_size resources is committed and its datasets are
+    reindexed. Processed resources leave the index for old_uri, so an
+    interrupted run is completed by running it again.
+    The progress is logged and stored in the job meta.
+    Return the number of rewritten resources
+    '''
+    chunk_size = chunk_size or ds_constants.DATASERVICE_JOB_DEFAULT_CHUNK_SIZE
+    if not ds_model.is_backfill_complete(
+            ds_constants.BACKFILL_DATASERVICES_CHECKPOINT):
+        log.warning('[replace_dataservice] %s -> %s: the data service index '
+                    'is not complete, run backfill-dataservices. Resources '
+                    'not indexed yet are not updated', old_uri, new_uri)
+    job = get_current_job()
+    resources = datasets = 0
+    while True:
+        try:
+            resource_ids, package_ids = ds_model.replace_dataservice_references(
+                old_uri, new_uri, chunk_size)
+            model.Session.commit()
+        except Exception:
+            model.Session.rollback()
+            raise
+        if not resource_ids:
+            break
+        for package_id in package_ids:
+            search.rebuild(package_id, defer_commit=True)
+        search.commit()
+        resources += len(resource_ids)
+        datasets += len(package_ids)
+        log.info('[replace_dataservice] %s -> %s: %s resources, %s dataset '
+                 'updates', old_uri, new_uri, resources, datasets)
+        if job:
+            job.meta['resources'] = resources
+            job.meta['datasets'] = datasets
+            job.save_meta()
+        if len(resource_ids) < chunk_size:
+            break
+    return resources
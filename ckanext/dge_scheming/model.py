@@ -0,0 +1,436 @@
+# Copyright (C) 2026 Entidad Pública Empresarial Red.es
+#
+# This file is part of "dge-scheming (datos.gob.es)".
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import datetime
+import json
+import logging
+
+from sqlalchemy import Column, Table, Index, ForeignKey, UnicodeText, DateTime
+from sqlalchemy import and_, bindparam, func, inspect, or_, select
+
+import ckan.model as model
+from ckan.model import meta
+
+import ckanext.dge_scheming.constants as ds_constants
+
+log = logging.getLogger(__name__)
+
+# Normalized copy of the values of the dct:identifier extra (a JSON list),
+# one row per identifier and dataset, used to check their uniqueness.
+# The state is read from the package table
+package_identifier_table = Table(
+    'dge_package_identifier', meta.metadata,
+    Column('identifier', UnicodeText, primary_key=True),
+    Column('package_id', UnicodeText,
+           ForeignKey('package.id', ondelete='CASCADE'), primary_key=True),
+    Index('idx_dge_package_identifier_package_id', 'package_id'),
+)
+
+# Reverse index of the access_service of the resources, one row per data
+# service URI and resource, to find the datasets served by a data service
+dataservice_reference_table = Table(
+    'dge_dataservice_reference', meta.metadata,
+    Column('dataservice', UnicodeText, primary_key=True),
+    Column('resource_id', UnicodeText, primary_key=True),
+    Column('package_id', UnicodeText,
+           ForeignKey('package.id', ondelete='CASCADE'), nullable=False),
+    Index('idx_dge_dataservice_reference_package_id', 'package_id'),
+)
+
+# Progress of resumable maintenance commands, by command name
+checkpoint_table = Table(
+    'dge_scheming_checkpoint', meta.metadata,
+    Column('name', UnicodeText, primary_key=True),
+    Column('value', UnicodeText),
+    Column('modified', DateTime, default=datetime.datetime.utcnow),
+)
+
+
+def setup():
+    '''
+    Create the tables of the extension if they do not exist
+    '''
+    if meta.engine is None:
+        return
+    for table in (package_identifier_table, dataservice_reference_table,
+                  checkpoint_table):
+        table.create(bind=meta.engine, checkfirst=True)
+    # Column of the first version of the table, no longer written
+    columns = inspect(meta.engine).get_columns(package_identifier_table.name)
+    if 'state' in [column['name'] for column in columns]:
+        meta.engine.execute('ALTER TABLE {} DROP COLUMN state'.format(
+            package_identifier_table.name))
+
+
+def get_checkpoint(name):
+    '''
+    Return the saved value of the checkpoint, None if there is none
+    '''
+    return model.Session.execute(
+        select([checkpoint_table.c.value]).where(
+            checkpoint_table.c.name == name)).scalar()
+
+
+def set_checkpoint(name, value):
+    '''
+    Save the value of the checkpoint in the session of the caller, so it is
+    committed together with the work it refers to
+    '''
+    delete_checkpoint(name)
+    model.Session.execute(checkpoint_table.insert().values(
+        name=name, value=value, modified=datetime.datetime.utcnow()))
+
+
+def delete_checkpoint(name):
+    model.Session.execute(checkpoint_table.delete().where(
+        checkpoint_table.c.name == name))
+
+
+def is_backfill_complete(name):
+    '''
+    Return True if the backfill with this checkpoint name has finished, so
+    its index can be trusted
+    '''
+    return get_checkpoint(name) == ds_constants.BACKFILL_COMPLETE
+
+
+def parse_value_list(value):
+    '''
+    :param value: multi-valued extra (dct:identifier, access_service...),
+        a JSON list or a str
+
+    Return the list of its distinct non empty values
+    '''
+    if not value:
+        return []
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            value = [value]
+    if not isinstance(value, list):
+        value = [value]
+    identifiers = []
+    for identifier in value:
+        if identifier and isinstance(identifier, str) \
+                and identifier not in identifiers:
+            identifiers.append(identifier)
+    return identifiers
+
+
+def update_package_identifiers(package):
+    '''
+    :param package: package model object
+
+    Replace the indexed identifiers of the package with the current value
+    of its dct:identifier extra. Runs in the session of the caller, so it
+    is committed or rolled back with the package itself
+    '''
+    identifiers = parse_value_list(
+        package.extras.get(ds_constants.IDENTIFIER_EXTRA_KEY))
+    session = model.Session
+    session.execute(package_identifier_table.delete().where(
+        package_identifier_table.c.package_id == package.id))
+    if identifiers:
+        session.execute(package_identifier_table.insert(), [
+            {'identifier': identifier, 'package_id': package.id}
+            for identifier in identifiers])
+
+
+def find_identifier_conflicts(identifiers, exclude_package_id=None):
+    '''
+    :param identifiers: list of dct:identifier values
+    :param exclude_package_id: package id not taken into account
+
+    Return a dict with the identifiers already used by an active package
+    and the ids of those packages, checking all of them in one query.
+    The state is read from the package table, since bulk_update_delete
+    changes it without calling the IPackageController hooks.
+    Requires a complete backfill-identifiers, see
+    find_identifier_conflicts_in_extras
+    '''
+    conflicts = {}
+    if not identifiers:
+        return conflicts
+    table = package_identifier_table
+    package = model.package_table
+    query = select([table.c.identifier, table.c.package_id]) \
+        .select_from(table.join(package, package.c.id == table.c.package_id)) \
+        .where(and_(table.c.identifier.in_(set(identifiers)),
+                    package.c.state == model.State.ACTIVE))
+    if exclude_package_id:
+        query = query.where(table.c.package_id != exclude_package_id)
+    for identifier, package_id in model.Session.execute(query):
+        conflicts.setdefault(identifier, []).append(package_id)
+    return conflicts
+
+
+def find_identifier_conflicts_in_extras(identifiers, exclude_package_id=None):
+    '''
+    :param identifiers: list of dct:identifier values
+    :param exclude_package_id: package id not taken into account
+
+    Same as find_identifier_conflicts, reading the identifier extras
+    instead of the index, for when the index is not complete yet
+    '''
+    conflicts = {}
+    identifiers = set(identifiers or [])
+    if not identifiers:
+        return conflicts
+    extra = model.package_extra_table
+    package = model.package_table
+    query = select([extra.c.package_id, extra.c.value]) \
+        .select_from(extra.join(package, package.c.id == extra.c.package_id)) \
+        .where(and_(extra.c.key == ds_constants.IDENTIFIER_EXTRA_KEY,
+                    extra.c.state == model.State.ACTIVE,
+                    package.c.state == model.State.ACTIVE,
+                    or_(*[extra.c.value.contains(identifier, autoescape=True)
+                          for identifier in identifiers])))
+    if exclude_package_id:
+        query = query.where(extra.c.package_id != exclude_package_id)
+    for package_id, value in model.Session.execute(query):
+        for identifier in identifiers.intersection(parse_value_list(value)):
+            conflicts.setdefault(identifier, []).append(package_id)
+    return conflicts
+
+
+def index_identifier_extras(after_id=None, limit=1000):
+    '''
+    :param after_id: last package_extra id already indexed, None to start
+    :param limit: number of package_extra rows read
+
+    Index the identifier extras following after_id in package_extra id
+    order (keyset pagination), replacing the rows of their packages with
+    bulk statements in the session of the caller.
+    Return the number of rows read and the id of the last one
+    '''
+    extra = model.package_extra_table
+    package = model.package_table
+    query = select([extra.c.id, extra.c.package_id, extra.c.value]) \
+        .select_from(extra.join(package, package.c.id == extra.c.package_id)) \
+        .where(and_(extra.c.key == ds_constants.IDENTIFIER_EXTRA_KEY,
+                    extra.c.state == model.State.ACTIVE))
+    if after_id:
+        query = query.where(extra.c.id > after_id)
+    rows = model.Session.execute(
+        query.order_by(extra.c.id).limit(limit)).fetchall()
+    if not rows:
+        return 0, after_id
+
+    values = {}
+    for extra_id, package_id, value in rows:
+        for identifier in parse_value_list(value):
+            values[(identifier, package_id)] = {
+                'identifier': identifier, 'package_id': package_id}
+    model.Session.execute(package_identifier_table.delete().where(
+        package_identifier_table.c.package_id.in_(
+            set(row[1] for row in rows))))
+    if values:
+        model.Session.execute(package_identifier_table.insert(),
+                              list(values.values()))
+    return len(rows), rows[-1][0]
+
+
+def update_dataservice_references(package_id, access_services):
+    '''
+    :param package_id: package id
+    :param access_services: dict with the access_service URIs of every
+        resource of the package, by resource id
+
+    Replace the reverse index rows of the package in the session of the
+    caller
+    '''
+    table = dataservice_reference_table
+    model.Session.execute(table.delete().where(
+        table.c.package_id == package_id))
+    values = [{'dataservice': uri, 'resource_id': resource_id,
+               'package_id': package_id}
+              for resource_id, uris in access_services.items()
+              for uri in uris]
+    if values:
+        model.Session.execute(table.insert(), values)
+
+
+def find_dataservice_references(uri, include_private=False, limit=None,
+                                offset=0):
+    '''
+    :param uri: access_service URI of the data service
+    :param include_private: include private datasets
+    :param limit: maximum number of datasets returned, all if None
+    :param offset: number of datasets skipped
+
+    Return the number of active datasets served by the data service and a
+    page of them, sorted by name, as dicts with their 'id', 'name' and the
+    ids of the served 'resources'
+    '''
+    table = dataservice_reference_table
+    package = model.package_table
+    conditions = [table.c.dataservice == uri,
+                  package.c.state == model.State.ACTIVE]
+    if not include_private:
+        conditions.append(package.c.private == False)
+    joined = table.join(package, package.c.id == table.c.package_id)
+
+    count = model.Session.execute(
+        select([func.count(func.distinct(table.c.package_id))])
+        .select_from(joined).where(and_(*conditions))).scalar()
+    packages_q = select([package.c.id, package.c.name]).distinct() \
+        .select_from(joined).where(and_(*conditions)) \
+        .order_by(package.c.name, package.c.id).offset(offset)
+    if limit is not None:
+        packages_q = packages_q.limit(limit)
+    datasets = [{'id': package_id, 'name': name, 'resources': []}
+                for package_id, name in model.Session.execute(packages_q)]
+    if datasets:
+        by_id = dict((dataset['id'], dataset) for dataset in datasets)
+        resources_q = select([table.c.package_id, table.c.resource_id]) \
+            .where(and_(table.c.dataservice == uri,
+                        table.c.package_id.in_(list(by_id)))) \
+            .order_by(table.c.resource_id)
+        for package_id, resource_id in model.Session.execute(resources_q):
+            by_id[package_id]['resources'].append(resource_id)
+    return count, datasets
+
+
+def index_resource_access_services(after_id=None, limit=1000):
+    '''
+    :param after_id: last resource id already indexed, None to start
+    :param limit: number of resource rows read
+
+    Rebuild the reverse index rows of the resources following after_id in
+    resource id order (keyset pagination), with bulk statements in the
+    session of the caller. Only active resources are indexed.
+    Return the number of rows read and the id of the last one
+    '''
+    resource = model.resource_table
+    query = select([resource.c.id, resource.c.package_id, resource.c.extras,
+                    resource.c.state])
+    if after_id:
+        query = query.where(resource.c.id > after_id)
+    rows = model.Session.execute(
+        query.order_by(resource.c.id).limit(limit)).fetchall()
+    if not rows:
+        return 0, after_id
+
+    table = dataservice_reference_table
+    model.Session.execute(table.delete().where(
+        table.c.resource_id.in_([row[0] for row in rows])))
+    values = {}
+    for resource_id, package_id, extras, state in rows:
+        if state != model.State.ACTIVE or not extras:
+            continue
+        if isinstance(extras, str):
+            try:
+                extras = json.loads(extras)
+            except ValueError:
+                continue
+        for uri in parse_value_list(
+                extras.get(ds_constants.RESOURCE_ACCESS_SERVICE_KEY)):
+            values[(uri, resource_id)] = {
+                'dataservice': uri, 'resource_id': resource_id,
+                'package_id': package_id}
+    if values:
+        model.Session.execute(table.insert(), list(values.values()))
+    return len(rows), rows[-1][0]
+
+
+def replace_dataservice_references(old_uri, new_uri=None, limit=1000):
+    '''
+    :param old_uri: access_service URI being replaced
+    :param new_uri: URI that replaces it, None to remove it
+    :param limit: maximum number of resources rewritten
+
+    Rewrite the access_service of the first limit resources that use
+    old_uri, the served_by_dataservice and metadata_modified of their
+    datasets and their reverse index rows, with bulk statements in the
+    session of the caller. Values stored as a list are kept as a list and
+    the rest are stored as a JSON string.
+    Rewritten resources leave the index for old_uri, so calling it again
+    continues with the next ones.
+    Return the ids of the rewritten resources and of their datasets
+    '''
+    table = dataservice_reference_table
+    references = model.Session.execute(
+        select([table.c.resource_id, table.c.package_id])
+        .where(table.c.dataservice == old_uri)
+        .order_by(table.c.resource_id).limit(limit)).fetchall()
+    if not references:
+        return [], []
+    resource_ids = [row[0] for row in references]
+    package_ids = sorted(set(row[1] for row in references))
+
+    resource = model.resource_table
+    resource_values = []
+    for resource_id, extras in model.Session.execute(
+            select([resource.c.id, resource.c.extras])
+            .where(resource.c.id.in_(resource_ids))):
+        if isinstance(extras, str):
+            extras = json.loads(extras)
+        extras = dict(extras or {})
+        value = extras.get(ds_constants.RESOURCE_ACCESS_SERVICE_KEY)
+        access_services = parse_value_list(value)
+        replaced = _replace_value(access_services, old_uri, new_uri)
+        if replaced != access_services:
+            extras[ds_constants.RESOURCE_ACCESS_SERVICE_KEY] = \
+                replaced if isinstance(value, list) else json.dumps(replaced)
+            resource_values.append({'_id': resource_id, '_extras': extras})
+    if resource_values:
+        model.Session.execute(
+            resource.update().where(resource.c.id == bindparam('_id'))
+            .values(extras=bindparam('_extras')), resource_values)
+
+    extra = model.package_extra_table
+    extra_values = []
+    for extra_id, value in model.Session.execute(
+            select([extra.c.id, extra.c.value]).where(and_(
+                extra.c.package_id.in_(package_ids),
+                extra.c.key == ds_constants.SERVED_BY_DATASERVICE_KEY))):
+        served_by = parse_value_list(value)
+        replaced = _replace_value(served_by, old_uri, new_uri)
+        if replaced != served_by:
+            extra_values.append({'_id': extra_id,
+                                 '_value': json.dumps(replaced)})
+    if extra_values:
+        model.Session.execute(
+            extra.update().where(extra.c.id == bindparam('_id'))
+            .values(value=bindparam('_value')), extra_values)
+
+    package = model.package_table
+    model.Session.execute(package.update()
+                          .where(package.c.id.in_(package_ids))
+                          .values(metadata_modified=datetime.datetime.utcnow()))
+
+    model.Session.execute(table.delete().where(and_(
+        table.c.dataservice.in_([old_uri, new_uri] if new_uri else [old_uri]),
+        table.c.resource_id.in_(resource_ids))))
+    if new_uri:
+        model.Session.execute(table.insert(), [
+            {'dataservice': new_uri, 'resource_id': resource_id,
+             'package_id': package_id}
+            for resource_id, package_id in references])
+    return resource_ids, package_ids
+
+
+def _replace_value(values, old_value, new_value=None):
+    replaced = {}
+    for value in values:
+        if value == old_value:
+            value = new_value
+        if value:
+            replaced.setdefault(value)
+    return list(replaced)
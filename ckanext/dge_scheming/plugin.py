@@ -21,10 +21,13 @@ import ckan.plugins as plugins
 import ckan.plugins.toolkit as toolkit
 import ckan.lib.plugins as lib_plugins
 import ckan.lib.helpers as h
+import ckan.model as model
 import ckanext.scheming.helpers as sh
 import ckanext.dge_scheming
 
-from ckanext.dge_scheming import validators, helpers
+from ckanext.dge_scheming import validators, helpers, views, cli, actions
+import ckanext.dge_scheming.constants as ds_constants
+import ckanext.dge_scheming.model as ds_model
 from ckantoolkit import (
     check_ckan_version,
 )
@@ -33,9 +36,15 @@ log = logging.getLogger(__name__)
 
 class DgeSchemingPlugin(plugins.SingletonPlugin, lib_plugins.DefaultTranslation):
     plugins.implements(plugins.IConfigurer, inherit=True)
+    plugins.implements(plugins.IConfigurable, inherit=True)
     plugins.implements(plugins.IValidators, inherit=True)
     plugins.implements(plugins.ITemplateHelpers, inherit=True)
+    plugins.implements(plugins.IBlueprint, inherit=True)
+    plugins.implements(plugins.IClick, inherit=True)
+    plugins.implements(plugins.IActions, inherit=True)
+    plugins.implements(plugins.IAuthFunctions, inherit=True)
     plugins.implements(plugins.IPackageController, inherit=True)
+    plugins.implements(plugins.IOrganizationController, inherit=True)
     plugins.implements(plugins.IResourceController, inherit=True)
     plugins.implements(plugins.ITranslation, inherit=True)
 
@@ -47,6 +56,32 @@ class DgeSchemingPlugin(plugins.SingletonPlugin, lib_plugins.DefaultTranslation)
     def update_config(self, config_):
         toolkit.add_template_directory(config_, 'templates')
         toolkit.add_public_directory(config_, 'public')
+        toolkit.add_resource('assets', 'dge_scheming')
+
+    # #########################################################################
+    # #########################################################################
+    # IConfigurable
+    # #########################################################################
+    # #########################################################################
+    def configure(self, config_):
+        ds_model.setup()
+        helpers.dge_configure_uri_cache(toolkit.asint(config_.get(
+            ds_constants.URI_CACHE_SIZE_CONFIG,
+            ds_constants.URI_CACHE_DEFAULT_SIZE)))
+        helpers.dge_configure_organization_cache(
+            toolkit.asint(config_.get(
+                ds_constants.ORGANIZATION_CACHE_SIZE_CONFIG,
+                ds_constants.ORGANIZATION_CACHE_DEFAULT_SIZE)),
+            toolkit.asint(config_.get(
+                ds_constants.ORGANIZATION_CACHE_TTL_CONFIG,
+                ds_constants.ORGANIZATION_CACHE_DEFAULT_TTL)))
+        helpers.dge_configure_license_propagation(
+            toolkit.asint(config_.get(
+                ds_constants.LICENSE_JOB_THRESHOLD_CONFIG,
+                ds_constants.LICENSE_JOB_DEFAULT_THRESHOLD)),
+            toolkit.asint(config_.get(
+                ds_constants.LICENSE_JOB_CHUNK_SIZE_CONFIG,
+                ds_constants.LICENSE_JOB_DEFAULT_CHUNK_SIZE)))
 
     # #########################################################################
     # #########################################################################
@@ -93,10 +128,15 @@ class DgeSchemingPlugin(plugins.SingletonPlugin, lib_plugins.DefaultTranslation)
             'dge_dataset_form_value': helpers.dge_dataset_form_value,
             'dge_dataset_form_lang_and_value': helpers.dge_dataset_form_lang_and_value,
             'dge_dataset_form_organization_list': helpers.dge_dataset_form_organization_list,
+            'dge_organization_autocomplete': helpers.dge_organization_autocomplete,
+            'dge_get_organization_option': helpers.dge_get_organization_option,
+            'dge_get_default_organization_option': helpers.dge_get_default_organization_option,
             'dge_multiple_field_required': helpers.dge_multiple_field_required,
             'dge_multiple_uri_field_one_required': helpers.dge_multiple_uri_field_one_required,
             'dge_dataset_license_to_distributions_license': helpers.dge_dataset_license_to_distributions_license,
             'dge_get_nti_field_choices': helpers.dge_get_nti_field_choices,
+            'dge_get_localized_choices': helpers.dge_get_localized_choices,
+            'dge_get_vocabulary_label': helpers.dge_get_vocabulary_label,
             'dge_get_application_profile': helpers.dge_get_application_profile,
             'dge_is_nti_application_profile': helpers.dge_is_nti_application_profile,
             'dge_is_dcatapes_application_profile': helpers.dge_is_dcatapes_application_profile,
@@ -107,6 +147,38 @@ class DgeSchemingPlugin(plugins.SingletonPlugin, lib_plugins.DefaultTranslation)
             'dge_is_list_of_items_field_value': helpers.dge_is_list_of_items_field_value
             }
 
+    # #########################################################################
+    # #########################################################################
+    # IBlueprint
+    # #########################################################################
+    # #########################################################################
+    def get_blueprint(self):
+        return views.get_blueprints()
+
+    # #########################################################################
+    # #########################################################################
+    # IClick
+    # #########################################################################
+    # #########################################################################
+    def get_commands(self):
+        return cli.get_commands()
+
+    # #########################################################################
+    # #########################################################################
+    # IActions
+    # #########################################################################
+    # #########################################################################
+    def get_actions(self):
+        return actions.get_actions()
+
+    # #########################################################################
+    # #########################################################################
+    # IAuthFunctions
+    # #########################################################################
+    # #########################################################################
+    def get_auth_functions(self):
+        return actions.get_auth_functions()
+
 
     # #########################################################################
     # #########################################################################
@@ -114,22 +186,81 @@ class DgeSchemingPlugin(plugins.SingletonPlugin, lib_plugins.DefaultTranslation)
     # #########################################################################
     # #########################################################################
     # CKAN < 2.10 hooks
+    # create, edit and delete are shared with IOrganizationController
+    def create(self, entity):
+        if isinstance(entity, model.Group):
+            helpers.dge_invalidate_organization_cache(entity)
+            return
+        ds_model.update_package_identifiers(entity)
+
     def edit(self, entity):
-        helpers.dge_sync_served_by_dataservice_for_manual_package(entity)
+        if isinstance(entity, model.Group):
+            helpers.dge_invalidate_organization_cache(entity)
+            return
+        ds_model.update_package_identifiers(entity)
+
+    def delete(self, entity):
+        if isinstance(entity, model.Group):
+            helpers.dge_invalidate_organization_cache(entity)
+            return
+        # The identifier rows are kept, conflicts are only checked against
+        # active packages
+
+    # after_create and after_update are shared with IResourceController,
+    # which passes the resource dict
+    def after_create(self, context, data_dict):
+        if 'package_id' in data_dict:
+            return
+        helpers.dge_index_dataservice_references(data_dict)
 
     def after_update(self, context, data_dict):
+        if 'package_id' in data_dict:
+            return
+        helpers.dge_sync_served_by_dataservice_for_manual_package(
+            model.Package.get(data_dict['id']), context, data_dict)
+        helpers.dge_index_dataservice_references(data_dict)
         helpers.dge_dataset_license_to_distributions_license(context, data_dict)
-        
+
+    def before_index(self, pkg_dict):
+        return helpers.dge_index_vocabulary_fields(pkg_dict)
+
+    # CKAN >= 2.10
+    def after_dataset_create(self, context, data_dict):
+        return self.after_create(context, data_dict)
+
+    def after_dataset_update(self, context, data_dict):
+        return self.after_update(context, data_dict)
+
+    def before_dataset_index(self, pkg_dict):
+        return self.before_index(pkg_dict)
+
     # #########################################################################
     # #########################################################################
     # IResourceController
     # #########################################################################
     # #########################################################################
+    # Changes of access_service are applied to served_by_dataservice in the
+    # package_update run by the resource action
     def before_create(self, context, resource):
-        return
-        
-    def after_create(self, context, resource):
-        return
+        helpers.dge_record_resource_access_services(context, None, resource)
+
+    def before_update(self, context, current, resource):
+        helpers.dge_record_resource_access_services(context, current, resource)
+
+    def before_delete(self, context, resource, resources):
+        current = next((r for r in resources if r.get('id') == resource.get('id')),
+                       None)
+        helpers.dge_record_resource_access_services(context, current, None)
+
+    # CKAN >= 2.10
+    def before_resource_create(self, context, resource):
+        return self.before_create(context, resource)
+
+    def before_resource_update(self, context, current, resource):
+        return self.before_update(context, current, resource)
+
+    def before_resource_delete(self, context, resource, resources):
+        return self.before_delete(context, resource, resources)
 
     # #########################################################################
     # #########################################################################
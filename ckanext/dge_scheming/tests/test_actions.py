@@ -0,0 +1,64 @@
+# Copyright (C) 2026 Entidad Pública Empresarial Red.es
+#
+# This file is part of "dge-scheming (datos.gob.es)".
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+from unittest import mock
+
+import pytest
+
+import ckan.plugins.toolkit as toolkit
+
+import ckanext.dge_scheming.model as ds_model
+from ckanext.dge_scheming import actions
+
+
+class TestIntParam(object):
+
+    def test_default(self):
+        assert actions._int_param({}, 'limit', 100) == 100
+
+    def test_value(self):
+        assert actions._int_param({'offset': '20'}, 'offset', 0) == 20
+
+    @pytest.mark.parametrize('key', ['limit', 'offset'])
+    def test_invalid_value_is_reported_on_its_key(self, key):
+        with pytest.raises(toolkit.ValidationError) as error:
+            actions._int_param({'limit': '10', 'offset': '5', key: 'x'}, key, 0)
+        assert list(error.value.error_dict) == [key]
+
+
+class TestDataserviceReplace(object):
+
+    @mock.patch.object(toolkit, 'enqueue_job')
+    @mock.patch.object(toolkit, 'check_access')
+    @mock.patch.object(ds_model, 'is_backfill_complete', return_value=False)
+    def test_refused_until_backfill_completes(self, is_backfill_complete,
+                                              check_access, enqueue_job):
+        with pytest.raises(toolkit.ValidationError) as error:
+            actions.dge_dataservice_replace(
+                {}, {'old_uri': 'http://example.org/ds'})
+        assert list(error.value.error_dict) == ['old_uri']
+        assert not enqueue_job.called
+
+    @mock.patch.object(toolkit, 'enqueue_job')
+    @mock.patch.object(toolkit, 'check_access')
+    @mock.patch.object(ds_model, 'is_backfill_complete', return_value=True)
+    def test_enqueued_after_backfill(self, is_backfill_complete,
+                                     check_access, enqueue_job):
+        enqueue_job.return_value.id = 'job'
+        assert actions.dge_dataservice_replace(
+            {}, {'old_uri': 'http://example.org/ds'}) == {'job_id': 'job'}
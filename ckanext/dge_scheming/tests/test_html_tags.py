@@ -0,0 +1,68 @@
+# Copyright (C) 2026 Entidad Pública Empresarial Red.es
+#
+# This file is part of "dge-scheming (datos.gob.es)".
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import random
+import warnings
+
+import bs4
+import pytest
+
+import ckanext.dge_scheming.validators as validators
+
+PIECES = ('a', ' ', '<', '>', '</', '<b>', '</b>', '&#', '&#x', '&', ';',
+          '&amp;', '<!--', '-->', '<!', '<?', '<![CDATA[', ']]>', '"', "'",
+          '=', '/', 'x1', '<script>', '</script>', '<br/>', '<a href="x">',
+          '<1', '< b>')
+
+
+def beautifulsoup_has_tags(text):
+    '''
+    The check tags_html_detected ran before the streaming scanner
+    '''
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        try:
+            return len(bs4.BeautifulSoup(text, 'html.parser').find_all()) > 0
+        except Exception:
+            return True
+
+
+class TestContainsHtmlTags(object):
+
+    @pytest.mark.parametrize('text,expected', [
+        ('Plain text', False),
+        ('1 < 2 and 3 > 2', False),
+        ('<b>bold</b>', True),
+        ('text <br/>', True),
+        ('a &# b <b>x</b>', False),
+        ('a &#x b <b>x</b>', False),
+        ('a &amp; b <b>x</b>', True),
+        ('<!-- <b>x</b> -->', False),
+    ])
+    def test_contains_html_tags(self, text, expected):
+        assert validators._contains_html_tags(text) is expected
+        assert beautifulsoup_has_tags(text) is expected
+
+    def test_matches_beautifulsoup(self):
+        rnd = random.Random(17)
+        texts = [''.join(rnd.choice(PIECES) for _ in range(rnd.randint(1, 10)))
+                 for _ in range(20000)]
+        mismatches = [text for text in texts
+                      if validators._contains_html_tags(text) !=
+                      beautifulsoup_has_tags(text)]
+        assert mismatches == []
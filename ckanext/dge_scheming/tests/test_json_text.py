@@ -0,0 +1,61 @@
+# Copyright (C) 2026 Entidad Pública Empresarial Red.es
+#
+# This file is part of "dge-scheming (datos.gob.es)".
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import copy
+import json
+import pickle
+
+import ckanext.dge_scheming.helpers as dh
+
+
+class TestDgeJsonText(object):
+
+    def test_decode_once(self):
+        data = {('title_translated',): json.dumps({'es': 'Título', 'en': 'Title'})}
+        value = dh.dge_decode_json_value(data, ('title_translated',))
+        envelope = data[('title_translated',)]
+        assert isinstance(envelope, dh.DgeJsonText)
+        assert dh.dge_decode_json_value(data, ('title_translated',)) == value
+        assert data[('title_translated',)] is envelope
+        assert json.loads(envelope) == value
+
+    def test_value_changes_do_not_reach_the_text(self):
+        urls = ['http://example.org/a']
+        text = dh.dge_json_text(urls)
+        urls.append('http://example.org/b')
+        text.value.append('http://example.org/c')
+        assert text.value == ['http://example.org/a']
+        assert json.loads(text) == text.value
+
+        data = {('url',): json.dumps({'es': ['http://example.org/a']})}
+        dh.dge_decode_json_value(data, ('url',))['es'].append('x')
+        assert dh.dge_decode_json_value(data, ('url',)) == {
+            'es': ['http://example.org/a']}
+
+    def test_deepcopy(self):
+        text = dh.dge_json_text(['http://example.org/a'])
+        copied = copy.deepcopy({'key': text})['key']
+        assert copied == text
+        assert copied.value == ['http://example.org/a']
+
+    def test_pickle(self):
+        text = dh.dge_json_text({'es': 'Título'})
+        restored = pickle.loads(pickle.dumps(text))
+        assert isinstance(restored, dh.DgeJsonText)
+        assert restored == text
+        assert restored.value == {'es': 'Título'}
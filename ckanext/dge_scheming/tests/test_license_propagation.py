@@ -0,0 +1,121 @@
+# Copyright (C) 2026 Entidad Pública Empresarial Red.es
+#
+# This file is part of "dge-scheming (datos.gob.es)".
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+from unittest import mock
+
+import pytest
+
+import ckan.model as model
+import ckan.plugins.toolkit as toolkit
+import ckan.tests.factories as factories
+import ckan.tests.helpers as test_helpers
+
+import ckanext.dge_scheming.constants as ds_constants
+import ckanext.dge_scheming.helpers as dh
+from ckanext.dge_scheming import jobs
+
+
+@pytest.mark.usefixtures('clean_db', 'clean_index')
+class TestPropagateDatasetLicense(object):
+
+    def setup_method(self):
+        self.queued = []
+        dh.dge_configure_license_propagation(1, 2)
+
+    def teardown_method(self):
+        dh.dge_configure_license_propagation(
+            ds_constants.LICENSE_JOB_DEFAULT_THRESHOLD,
+            ds_constants.LICENSE_JOB_DEFAULT_CHUNK_SIZE)
+
+    def _enqueue_job(self, fn, args=None, **kwargs):
+        self.queued.append((fn, args))
+
+    def _run_queued_jobs(self):
+        queued, self.queued = self.queued, []
+        for fn, args in queued:
+            fn(*args)
+
+    def _dataset(self, license_id='cc-by', num_resources=3):
+        return factories.Dataset(license_id=license_id, resources=[
+            {'url': 'http://example.org/{}'.format(i),
+             'resource_license': license_id}
+            for i in range(num_resources)])
+
+    def _update_license(self, package_id, license_id):
+        model.Package.get(package_id).license_id = license_id
+        dh.dge_dataset_license_to_distributions_license(
+            {'model': model}, {'id': package_id, 'license_id': license_id})
+
+    def _resource_licenses(self, package_id):
+        model.Session.expire_all()
+        return [resource.extras.get('resource_license') for resource
+                in model.Package.get(package_id).resources]
+
+    def _indexed_resource_licenses(self, package_id):
+        result = test_helpers.call_action(
+            'package_search', fq='id:{}'.format(package_id))
+        return [resource.get('resource_license')
+                for resource in result['results'][0]['resources']]
+
+    def test_job_enqueued_after_commit(self):
+        dataset = self._dataset()
+        with mock.patch.object(toolkit, 'enqueue_job', self._enqueue_job):
+            self._update_license(dataset['id'], 'odc-by')
+            assert self.queued == []
+            model.Session.commit()
+        assert len(self.queued) == 1
+
+        self._run_queued_jobs()
+
+        assert self._resource_licenses(dataset['id']) == ['odc-by'] * 3
+        assert self._indexed_resource_licenses(dataset['id']) == ['odc-by'] * 3
+
+    def test_job_dropped_on_rollback(self):
+        dataset = self._dataset()
+        with mock.patch.object(toolkit, 'enqueue_job', self._enqueue_job):
+            self._update_license(dataset['id'], 'odc-by')
+            model.Session.rollback()
+            model.Session.commit()
+        assert self.queued == []
+        assert self._resource_licenses(dataset['id']) == ['cc-by'] * 3
+
+    def test_enqueue_failure_keeps_commit(self, caplog):
+        dataset = self._dataset()
+        failing = mock.Mock(side_effect=Exception('Redis is down'))
+        with mock.patch.object(toolkit, 'enqueue_job', failing):
+            self._update_license(dataset['id'], 'odc-by')
+            model.Session.commit()
+        assert failing.call_count == 1
+        assert model.Package.get(dataset['id']).license_id == 'odc-by'
+        assert dataset['id'] in caplog.text
+        assert 'propagate_dataset_license' in caplog.text
+
+        # The failed job is not enqueued again on the next commit
+        with mock.patch.object(toolkit, 'enqueue_job', self._enqueue_job):
+            model.Session.commit()
+        assert self.queued == []
+
+    def test_job_reads_committed_license(self):
+        dataset = self._dataset()
+        model.Package.get(dataset['id']).license_id = 'odc-odbl'
+        model.Session.commit()
+
+        assert jobs.propagate_dataset_license(dataset['id'], 'odc-by', 2) == 3
+
+        assert self._resource_licenses(dataset['id']) == ['odc-odbl'] * 3
+        assert self._indexed_resource_licenses(dataset['id']) == ['odc-odbl'] * 3
@@ -0,0 +1,46 @@
+# Copyright (C) 2026 Entidad Pública Empresarial Red.es
+#
+# This file is part of "dge-scheming (datos.gob.es)".
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+from types import SimpleNamespace
+
+import ckanext.dge_scheming.helpers as dh
+
+
+class TestOrganizationCache(object):
+
+    def setup_method(self):
+        dh._organization_cache.clear()
+
+    def teardown_method(self):
+        dh._organization_cache.clear()
+
+    def test_invalidate_after_rename(self):
+        info = {'group_id': 'org-id', 'id': 'org-id', 'extras': {}}
+        not_found = {'group_id': None, 'id': None, 'extras': {}}
+        dh._organization_cache.set('org-id', info)
+        dh._organization_cache.set('old-name', info)
+        dh._organization_cache.set('new-name', not_found)
+        dh._organization_cache.set('other', not_found)
+
+        dh.dge_invalidate_organization_cache(
+            SimpleNamespace(id='org-id', name='new-name'))
+
+        assert dh._organization_cache.get('org-id') is None
+        assert dh._organization_cache.get('old-name') is None
+        assert dh._organization_cache.get('new-name') is None
+        assert dh._organization_cache.get('other') == not_found
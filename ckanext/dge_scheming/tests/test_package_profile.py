@@ -0,0 +1,95 @@
+# Copyright (C) 2026 Entidad Pública Empresarial Red.es
+#
+# This file is part of "dge-scheming (datos.gob.es)".
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import pytest
+
+import ckanext.dge_scheming.constants as ds_constants
+import ckanext.dge_scheming.helpers as dh
+
+RESOURCE_FIELDS = ('id', 'url', 'name', 'format', 'description',
+                   'resource_license', 'access_service')
+EXTRAS = (('publisher_identifier', 'E00003901'),
+          (ds_constants.APPLICATION_PROFILE_KEY, ds_constants.NTI),
+          ('theme', '[]'),
+          ('spatial', '[]'),
+          ('language', '["es"]'))
+
+
+class CountingDict(dict):
+    '''
+    Flattened dict that counts key lookups and iterated keys
+    '''
+    accesses = 0
+
+    def __contains__(self, key):
+        self.accesses += 1
+        return dict.__contains__(self, key)
+
+    def __getitem__(self, key):
+        self.accesses += 1
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        self.accesses += 1
+        return dict.get(self, key, default)
+
+    def __iter__(self):
+        for key in dict.__iter__(self):
+            self.accesses += 1
+            yield key
+
+
+def flattened_dataset(num_resources, guid=None):
+    data = {('name',): 'dataset', ('title',): 'Dataset'}
+    extras = EXTRAS + ((('guid', guid),) if guid else ())
+    for index, (key, value) in enumerate(extras):
+        data[(ds_constants.EXTRAS, index, ds_constants.KEY)] = key
+        data[(ds_constants.EXTRAS, index, ds_constants.VALUE)] = value
+    for index in range(num_resources):
+        for field in RESOURCE_FIELDS:
+            data[(ds_constants.RESOURCES, index, field)] = '{}-{}'.format(
+                field, index)
+    return CountingDict(data)
+
+
+@pytest.mark.parametrize('num_resources', [10, 1000, 10000])
+class TestPackageProfile(object):
+
+    def test_profile_is_computed_once(self, num_resources):
+        data = flattened_dataset(num_resources)
+        context = {}
+        for key in list(dict.keys(data)):
+            profile = dh.dge_get_package_profile(data, context)
+            assert profile.is_manual
+            assert profile.is_nti
+            assert profile.has_resources
+        # One probe of the extras plus has_resources stopping at the first
+        # resource key, whatever the number of resources
+        dataset_keys = len(dict.keys(data)) - num_resources * len(RESOURCE_FIELDS)
+        assert data.accesses <= 2 * len(EXTRAS) + 2 + dataset_keys + 1
+
+    def test_helpers_only_probe_the_extras(self, num_resources):
+        data = flattened_dataset(num_resources, guid='harvested-guid')
+        calls = num_resources * len(RESOURCE_FIELDS)
+        for _ in range(calls):
+            assert dh.dge_has_guid(data)
+            assert dh.dge_get_application_profile(data) == ds_constants.NTI
+            assert dh.dge_is_nti_application_profile(data)
+        # Each call costs O(number of extras), never O(size of the dict)
+        per_call = 2 * (len(EXTRAS) + 1) + 2
+        assert data.accesses <= 3 * calls * per_call
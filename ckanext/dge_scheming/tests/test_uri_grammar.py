@@ -0,0 +1,131 @@
+# Copyright (C) 2026 Entidad Pública Empresarial Red.es
+#
+# This file is part of "dge-scheming (datos.gob.es)".
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import random
+import urllib.parse
+
+import rfc3987
+
+import ckanext.dge_scheming.constants as ds_constants
+import ckanext.dge_scheming.helpers as dh
+
+
+SCHEMES = ('http', 'https', 'ftp', 'urn', 'mailto', 'file', 'h2o', 'a+b.c-d',
+           '1http', '', 'ht tp')
+HOSTS = ('datos.gob.es', 'www.example.org', 'localhost', '127.0.0.1',
+         '256.1.1.1', 'user:pw@example.org', 'ex%41mple.org', 'ex%4gmple.org',
+         'example.org:8080', 'example.org:', 'example.org:80a', '[::1]',
+         '[2001:db8::8a2e:370:7334]', '[::ffff:192.0.2.1]', '[v1.fe80::a]',
+         '[1:2:3:4:5:6:7:8:9]', '[::1', 'exa mple.org', 'exa_mple.org',
+         'ex"ample.org', '')
+PATHS = ('', '/', '/a/b', '/a b', '/%20', '/%2', '/ñ', '//a', '/a:b@c',
+         "/!$&'()*+,;=", '/a{b}', '/a|b', '/a\\b')
+QUERIES = ('', '?', '?a=1&b=2', '?a=/?:@', '?a b', '?%zz', '?a#b')
+FRAGMENTS = ('', '#', '#top', '#a#b', '#a b', '#/?:@')
+ALPHABET = ('abcXYZ019-._~:/?#[]@!$&\'()*+,;=% "<>\\^`{|}ñ\t' + '%41%4g%%')
+
+
+def uri_corpus(size=20000, seed=3987):
+    '''
+    Return a reproducible list of URI-like strings: combinations of valid
+    and invalid schemes, hosts, paths, queries and fragments, plus random
+    strings over the URI alphabet
+    '''
+    rnd = random.Random(seed)
+    corpus = []
+    for i in range(size):
+        scheme = rnd.choice(SCHEMES)
+        separator = rnd.choice((':', '://', '://', ':/'))
+        corpus.append(scheme + separator + rnd.choice(HOSTS) +
+                      rnd.choice(PATHS) + rnd.choice(QUERIES) +
+                      rnd.choice(FRAGMENTS))
+        corpus.append(rnd.choice(SCHEMES) + ':' + ''.join(
+            rnd.choice(ALPHABET) for _ in range(rnd.randint(0, 30))))
+    return corpus
+
+
+def reference_is_uri(value):
+    '''
+    dge_is_uri as it was with rfc3987, without the cache and the fast paths
+    '''
+    if not value or value.strip() == '':
+        return False
+    try:
+        url = urllib.parse.urlparse(value)
+    except ValueError:
+        return False
+    netloc = url.netloc
+    if dh.h.is_url(value) and not(netloc and len(netloc) > 0):
+        return False
+    else:
+        prev_netloc = ''
+        while '%' in netloc and prev_netloc != netloc:
+            prev_netloc = netloc
+            netloc = urllib.parse.unquote(netloc)
+    url2 = netloc
+    if url.scheme and len(url.scheme) > 0:
+        url2 = url.scheme + '://' + netloc
+    return bool(rfc3987.match(url2, rule='URI'))
+
+
+class TestUriGrammar(object):
+
+    def test_grammar_matches_rfc3987(self):
+        mismatches = [value for value in uri_corpus()
+                      if bool(dh._uri_re.match(value)) !=
+                      bool(rfc3987.match(value, rule='URI'))]
+        assert mismatches == []
+
+    def test_is_uri_matches_rfc3987(self):
+        mismatches = [value for value in uri_corpus(5000)
+                      if dh._dge_is_uri(value) != reference_is_uri(value)]
+        assert mismatches == []
+
+
+def known_prefix_corpus(size=2000, seed=4):
+    '''
+    Return URIs under the known vocabulary prefixes with random tails, and
+    near misses of those prefixes that must take the generic path
+    '''
+    rnd = random.Random(seed)
+    tails = [''] + [value.split(':', 1)[1] for value in uri_corpus(size, seed)]
+    corpus = []
+    for prefix in ds_constants.KNOWN_VOCABULARY_URI_PREFIXES:
+        scheme, rest = prefix.split('://', 1)
+        near_misses = (prefix[:-1], prefix.upper(), scheme + ':/' + rest,
+                       scheme + 's://' + rest, prefix.replace('.', '-', 1))
+        for tail in rnd.sample(tails, min(len(tails), size)):
+            corpus.append(prefix + tail)
+            corpus.append(rnd.choice(near_misses) + tail)
+    return corpus
+
+
+class TestKnownVocabularyPrefixes(object):
+
+    def setup_method(self):
+        dh._uri_validity_cache.clear()
+
+    def test_is_uri_fast_path_matches_generic_path(self):
+        mismatches = [value for value in known_prefix_corpus()
+                      if dh.dge_is_uri(value) != dh._dge_is_uri(value)]
+        assert mismatches == []
+
+    def test_is_url_fast_path_matches_generic_path(self):
+        mismatches = [value for value in known_prefix_corpus()
+                      if dh.dge_is_url(value) != dh._dge_is_url(value)]
+        assert mismatches == []
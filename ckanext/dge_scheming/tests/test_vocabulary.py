@@ -0,0 +1,54 @@
+# Copyright (C) 2026 Entidad Pública Empresarial Red.es
+#
+# This file is part of "dge-scheming (datos.gob.es)".
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import pytest
+
+import ckanext.dge_scheming.constants as ds_constants
+import ckanext.dge_scheming.vocabulary as ds_vocabulary
+
+SCIENCE = 'http://datos.gob.es/kos/sector-publico/sector/ciencia-tecnologia'
+DATA_THEME = 'http://publications.europa.eu/resource/authority/data-theme/'
+
+
+class TestVocabulary(object):
+
+    def test_by_value(self):
+        assert ds_vocabulary.THEMES.get(SCIENCE)['notation'] == 'ciencia-tecnologia'
+        assert SCIENCE in ds_vocabulary.THEMES
+        assert ds_vocabulary.THEMES.get('http://example.org/theme') is None
+
+    def test_by_notation(self):
+        theme = ds_vocabulary.THEMES.by_notation['ciencia-tecnologia']
+        assert theme['value'] == SCIENCE
+        assert 'unknown' not in ds_vocabulary.THEMES.by_notation
+
+    def test_by_dcat_ap(self):
+        themes = ds_vocabulary.THEMES.by_dcat_ap[DATA_THEME + 'TECH']
+        assert SCIENCE in [theme['value'] for theme in themes]
+        assert all(theme['dcat_ap'] == DATA_THEME + 'TECH' for theme in themes)
+        # Several datos.gob.es themes share a DCAT-AP theme
+        assert len(ds_vocabulary.THEMES.by_dcat_ap[DATA_THEME + 'EDUC']) > 1
+        expected = set(theme['dcat_ap']
+                       for theme in ds_constants.DATOSGOB_DCT_THEME_CHOICES)
+        assert set(ds_vocabulary.THEMES.by_dcat_ap) == expected
+
+    def test_immutable(self):
+        with pytest.raises(TypeError):
+            ds_vocabulary.THEMES.by_notation['x'] = None
+        with pytest.raises(TypeError):
+            ds_vocabulary.THEMES.get(SCIENCE)['label']['es'] = 'x'
@@ -23,6 +23,7 @@ import urllib.request, urllib.parse, urllib.error
 import urllib.parse
 import six
 import datetime
+from html.parser import HTMLParser
 
 import ckan.authz as authz
 import ckan.lib.helpers as h
@@ -32,6 +33,8 @@ import ckan.model as model
 import ckan.plugins.toolkit as toolkit
 import ckanext.dge_scheming.helpers as dh
 import ckanext.dge_scheming.constants as ds_constants
+import ckanext.dge_scheming.model as ds_model
+import ckanext.dge_scheming.vocabulary as ds_vocabulary
 from ckanext.dge.helpers import dge_get_format_from_vocabulary_uri
 from dateutil.parser import parse as parse_date
 from ckan.logic.validators import tag_string_convert
@@ -96,8 +99,10 @@ def uri_text(field, schema):
     def validator(key, data, errors, context):
         log.debug('{} validating. Key: {} required: {}'.format(header, key, required))
         
+        profile = dh.dge_get_package_profile(data, context)
+
         # For web form submissions (not harvesting), store first dcat:accessURL in resource URL
-        if not dh.dge_has_guid(data):
+        if profile.is_manual:
             url_from_access_url(data,key)
         value = data[key]
     
@@ -138,7 +143,7 @@ def uri_text(field, schema):
                     data[resource_license_key] = dataset_license_tmp
 
         # In DCAT-AP-ES 1.0.0 dataset's dct:license is obsolete, but mandatory in NTI-RISP
-        if required or (nti_required and dh.dge_has_guid(data) and not dh.dge_is_dcatapes_application_profile(data)):
+        if required or (nti_required and profile.has_guid and not profile.is_dcatapes):
             not_empty(key, data, errors, context)
         else:
             ignore_missing(key, data, errors, context)
@@ -180,7 +185,10 @@ def multiple_uri_text(field, schema):
             return
         
         # Checking if dataset is dcatapes when dct:identifier is being validated (harvesting and web form)
-        is_dcatapes = (not dh.dge_has_guid(data) or dh.dge_is_dcatapes_application_profile(data)) if key == ds_constants.IDENTIFIER_KEY else False
+        is_dcatapes = False
+        if key == ds_constants.IDENTIFIER_KEY:
+            profile = dh.dge_get_package_profile(data, context)
+            is_dcatapes = profile.is_manual or profile.is_dcatapes
         
         value = data[key]
 
@@ -228,21 +236,19 @@ def multiple_uri_text(field, schema):
                 errors[key] = [_('Missing value')]
 
             if not errors[key]:
-                data[key] = json.dumps(out)
+                data[key] = dh.dge_json_text(out)
             return
 
         # 3. separate fields
         found = {}
         prefix = key[-1] + '-'
-        extras = data.get(key[:-1] + ('__extras',), {})
 
         # Validation
         url_errors = False
         
         index = -1
-        for name, text in extras.items():
-            if not name.startswith(prefix):
-                continue
+        for name, text in dh.dge_get_extras_by_prefix(
+                data, key[:-1], prefix, context):
             if not text:
                 continue
             index = name.split('-', 1)[1]
@@ -268,9 +274,8 @@ def multiple_uri_text(field, schema):
         if url_errors:
             return
 
-        for name, text in extras.items():
-            if not name.startswith(prefix):
-                continue
+        for name, text in dh.dge_get_extras_by_prefix(
+                data, key[:-1], prefix, context):
             if not text:
                 continue
             index = name.split('-', 1)[1]
@@ -284,7 +289,7 @@ def multiple_uri_text(field, schema):
         
         # Avoiding storing empty lists
         if out and len(out) > 0:
-            data[key] = json.dumps(out)
+            data[key] = dh.dge_json_text(out)
           
         # Ignoring missing or empty if not required
         if not required_one:
@@ -340,7 +345,8 @@ def multiple_checkbox_language(field, schema):
                 return
 
             # If value comes from manual form or DCAT-AP-ES harvesting Spanish is mandatory
-            if not dh.dge_has_guid(data) or dh.dge_is_dcatapes_application_profile(data):
+            profile = dh.dge_get_package_profile(data, context)
+            if profile.is_manual or profile.is_dcatapes:
                 if required_value and not required_value in value:
                     errors[key] = [_('It is mandatory to include Spanish if any languages are selected')]
             
@@ -373,7 +379,7 @@ def date_frequency(field, schema):
         if value is not missing:
             if isinstance(value, str):
                 try:
-                    value = json.loads(value)
+                    value = dh.dge_decode_json_value(data, key)
                 except ValueError:
                     errors[key].append(_('Failed to decode JSON string'))
                     return
@@ -393,7 +399,7 @@ def date_frequency(field, schema):
             frequency_value = value['value']
             
             if frequency_type and frequency_value is not None:
-                if not frequency_type in ds_constants.FREQUENCY_VALUES:
+                if not frequency_type in ds_vocabulary.FREQUENCY_TYPES:
                     errors[key] = [_('The frequency type is no allowed')]
                 try:
                     int(frequency_value)
@@ -416,7 +422,7 @@ def date_frequency(field, schema):
                         frequency_identifier = frequency_uri[len(ds_constants.FREQUENCY_EUROPEAN_PREFIX):].lower()
                     else:
                         frequency_identifier = dh.dge_parse_frequency_identifier(frequency_type, frequency_value)
-                    if not frequency_identifier in ds_constants.FREQUENCY_IDENTIFIERS:
+                    if not frequency_identifier in ds_vocabulary.FREQUENCY_IDENTIFIERS:
                         frequency_identifier = ds_constants.FREQUENCY_IDENTIFIER_OTHER
                     out = {'type': frequency_type, 'value': frequency_value, 'uri': frequency_uri, 'identifier': frequency_identifier}
                     data[key] = json.dumps(out)
@@ -441,7 +447,7 @@ def date_frequency(field, schema):
 
         # transform to JSON
         if frequency_identifier:
-            if not frequency_identifier in ds_constants.FREQUENCY_IDENTIFIERS:
+            if not frequency_identifier in ds_vocabulary.FREQUENCY_IDENTIFIERS:
                 frequency_identifier = ds_constants.FREQUENCY_IDENTIFIER_OTHER
             uri = ds_constants.FREQUENCY_EUROPEAN_PREFIX + frequency_identifier.upper()
             out = {'type': 'uri', 'value': -1, 'uri': uri, 'identifier': frequency_identifier}
@@ -525,7 +531,7 @@ def multilanguage_url(field, schema):
                         dataset_title = extras[title_lang]
 
                         # Generate title prefix
-                        dir3 = _get_dir3(data)
+                        dir3 = _get_dir3(data, key)
                         if dir3:
                             dataset_title = dir3 + '-' + dataset_title
 
@@ -535,8 +541,7 @@ def multilanguage_url(field, schema):
                                   data[key], l)
                         break
 
-    def _get_organization(data, key):
-        organization = None
+    def _get_dir3(data, key):
         field_prefix = field['organization_field']
         organization_prefix = field['organization_prefix']
         extras = data.get(key[:-1] + ('__extras',), {})
@@ -545,37 +550,11 @@ def multilanguage_url(field, schema):
             publisher_id = extras[field_prefix]
 
         if publisher_id and organization_prefix:
-            organization = h.get_organization(publisher_id)
-            if not organization:
-                organization = toolkit.get_action('dge_organization_publisher')(
-                    {'model': model}, {'id': publisher_id})
-        return organization
-
-    def _get_dir3(data, key):
-        organization_prefix = field['organization_prefix']
-        organization = _get_organization(data, key)
-        log.debug('[_get_dir3]  organization_prefix %s organization  %s', organization_prefix, organization)
-        if organization and organization['extras']:
-            for extra in organization['extras']:
-                if extra['key'] == organization_prefix and extra['state'] == 'active':
-                    return extra['value'].lower()
-                    break
-
-    def _get_dir3_history(data, key):
-        dir3_history = []
-        organization_prefix = field['organization_prefix']
-        organization = _get_organization(data, key)
-        organization_id = organization['id'] if 'id' in list(organization.keys(
-        )) else None
-
-        if organization and organization_id:
-            result = model.Session.execute("""SELECT distinct value FROM group_extra_revision
-            WHERE group_id = '{organization_id}'
-            AND "key" = '{organization_prefix}'""".format(organization_id=organization_id, organization_prefix=organization_prefix))
-            if result:
-                for value in result:
-                    dir3_history.append(value[0].lower())
-        return dir3_history
+            organization = dh.dge_get_organization_info(publisher_id)
+            log.debug('[_get_dir3]  organization_prefix %s organization  %s', organization_prefix, organization)
+            dir3 = organization['extras'].get(organization_prefix)
+            if dir3 is not None:
+                return dir3.lower()
 
     return validator
 
@@ -709,9 +688,9 @@ def date_period(field, schema):
 
         datetime_errors = False
         valid_indexes = []
-        for name, text in extras.items():
-            if not name.startswith(prefix):
-                continue
+        parsed = {}
+        for name, text in dh.dge_get_extras_by_prefix(
+                data, key[:-1], prefix, context):
             if not text:
                 continue
 
@@ -727,7 +706,8 @@ def date_period(field, schema):
 
             # Create datetime and validation
             try:
-                date = h.date_str_to_datetime(datetime)
+                date = _form_date_to_datetime(datetime)
+                parsed[(type_field, index)] = date
                 valid_indexes.append(index)
             except (TypeError, ValueError) as e:
                 errors[key].append(_('Date time format incorrect'))
@@ -741,31 +721,14 @@ def date_period(field, schema):
         for index in valid_indexes:
             period = {}
 
-            # Get from
-            date_from_value = extras.get(short_prefix + 'date-from-' + index)
-            if date_from_value:
-                datetime = date_from_value
-                time_from_value = extras.get(
-                    short_prefix + 'time-from-' + index)
-                if time_from_value:
-                    datetime = date_from_value + " " + time_from_value
-                try:
-                    date = h.date_str_to_datetime(datetime)
-                    period['from'] = date.strftime("%Y-%m-%dT%H:%M:%S")
-                except (TypeError, ValueError) as e:
-                    continue
+            # Get from and to, already parsed in the validation
+            date = parsed.get(('from', index))
+            if date:
+                period['from'] = date.strftime("%Y-%m-%dT%H:%M:%S")
 
-            date_to_value = extras.get(short_prefix + 'date-to-' + index)
-            if date_to_value:
-                datetime = date_to_value
-                time_to_value = extras.get(short_prefix + 'time-to-' + index)
-                if time_to_value:
-                    datetime = date_to_value + " " + time_to_value
-                try:
-                    date = h.date_str_to_datetime(datetime)
-                    period['to'] = date.strftime("%Y-%m-%dT%H:%M:%S")
-                except (TypeError, ValueError) as e:
-                    continue
+            date = parsed.get(('to', index))
+            if date:
+                period['to'] = date.strftime("%Y-%m-%dT%H:%M:%S")
 
             if period:
                 found[new_index] = period
@@ -820,7 +783,7 @@ def multiple_one_value(key, data, errors, context):
     if value is not missing:
         if isinstance(value, str):
             try:
-                value = json.loads(value)
+                value = dh.dge_decode_json_value(data, key)
             except ValueError:
                 errors[key].append(_('Failed to decode JSON string'))
                 return
@@ -859,12 +822,9 @@ def multiple_one_value(key, data, errors, context):
         return
 
     prefix = key[-1] + '-'
-    extras = data.get(key[:-1] + ('__extras',), {})
-
-    for name, text in extras.items():
-        if not isinstance(name, str) or not name.startswith(prefix):
-            continue
 
+    for name, text in dh.dge_get_extras_by_prefix(
+            data, key[:-1], prefix, context):
         lang = name.split('-', 1)[1]
         m = re.match(ds_constants.ISO_639_LANGUAGE, lang)
         if not m:
@@ -940,7 +900,7 @@ def multiple_required_language(field, schema):
         if value is not missing:
             if isinstance(value, str):
                 try:
-                    value = json.loads(value)
+                    value = dh.dge_decode_json_value(data, key)
                 except ValueError:
                     errors[key].append(_('Failed to decode JSON string'))
                     return
@@ -984,12 +944,9 @@ def multiple_required_language(field, schema):
             return
 
         prefix = key[-1] + '-'
-        extras = data.get(key[:-1] + ('__extras',), {})
-
-        for name, text in extras.items():
-            if not isinstance(name, str) or not name.startswith(prefix):
-                continue
 
+        for name, text in dh.dge_get_extras_by_prefix(
+                data, key[:-1], prefix, context):
             lang = name.split('-', 1)[1]
             m = re.match(ds_constants.ISO_639_LANGUAGE, lang)
             if not m:
@@ -1032,30 +989,19 @@ def select_organization(field, schema):
             data.pop(key, None)
             raise df.StopOnError
 
-        model = context['model']
-        user = context['user']
-        user = model.User.get(user)
         if value == '':
             if not authz.check_config_permission('create_unowned_dataset'):
                 raise Invalid(_('A organization must be supplied'))
             return
 
-        group = model.Group.get(value)
-        if not group:
+        organization = dh.dge_get_organization_info(value)
+        group_id = organization['group_id']
+        if not group_id:
             raise Invalid(_('Organization does not exist'))
-        group_id = group.id
-        organization = h.get_organization(group.id)
-        org_dir3 = None
-        if not organization:
-                organization = toolkit.get_action('dge_organization_publisher')(
-                    {'model': model}, {'id': group.id})
-        if organization and organization['extras']:
-            for extra in organization['extras']:
-                if extra['key'] == organization_prefix and extra['state'] == 'active':
-                    org_dir3 = extra['value'].upper()
-                    
+        org_dir3 = organization['extras'].get(organization_prefix)
+
         if org_dir3:
-            data[ds_constants.PUBLISHER_URI_KEY] = publisher_uri_prefix + org_dir3
+            data[ds_constants.PUBLISHER_URI_KEY] = publisher_uri_prefix + org_dir3.upper()
         else:
             raise Invalid(_('Organization does not exist or is not active'))
         
@@ -1072,24 +1018,19 @@ PACKAGE VALIDATOR TO AVOID SPECIAL CHARS SCRIPTING
 
 @scheming_validator
 def tags_html_detected(field, schema):
-    from bs4 import BeautifulSoup
 
     def validator(key, data, errors, context):
-        if errors[key] or 'resources' in str(data):
+        if errors[key] or dh.dge_get_package_profile(data, context).has_resources:
             return
 
         value = data.get(key)
         languages = []
         prefix = key[0]
 
-        extras = data.get(('__extras',), {})
-
-        for name, text in extras.items():
-            if not name.startswith(prefix):
-                continue
+        for name, text in dh.dge_get_extras_by_prefix(
+                data, (), prefix + '-', context):
             if text:
-                soup = BeautifulSoup(text, 'html.parser')
-                if len(soup.find_all()) > 0 and name.split('-')[0] == prefix:
+                if _contains_html_tags(text):
                     language = config.get('ckan.locale_order')
                     suffix = name.split('-')[1]
                     if suffix in language:
@@ -1099,13 +1040,52 @@ def tags_html_detected(field, schema):
                         errors[(prefix,)] = ['Contiene tag(s) HTML']
 
         if value is not missing:
-            soup = BeautifulSoup(value, 'html.parser')
-            if len(soup.find_all()) > 0:
+            if _contains_html_tags(value):
                 errors[key].append('Contiene tag(s) HTML')
 
     return validator
 
 
+_html_start_tag_open_re = re.compile(r'<[a-zA-Z]')
+
+
+class _HtmlTagFound(Exception):
+    pass
+
+
+class _HtmlTagScanner(HTMLParser):
+    '''
+    Stops parsing at the first start tag
+    '''
+    def handle_starttag(self, tag, attrs):
+        raise _HtmlTagFound()
+
+
+def _contains_html_tags(text):
+    '''
+    Return True if text has any HTML element, with the same result as
+    BeautifulSoup(text, 'html.parser').find_all(), which uses this parser.
+    html.parser only opens a tag on '<' followed by a letter, so text
+    without it is not parsed. Otherwise the whole text is fed, as an
+    incomplete character reference before the first '<' changes how the
+    rest is parsed, and parsing stops at the first tag.
+    Malformed markup that BeautifulSoup rejected is reported as HTML.
+    '''
+    if not isinstance(text, str):
+        return False
+    if not _html_start_tag_open_re.search(text):
+        return False
+    scanner = _HtmlTagScanner(convert_charrefs=False)
+    try:
+        scanner.feed(text)
+        scanner.close()
+    except _HtmlTagFound:
+        return True
+    except AssertionError:
+        return True
+    return False
+
+
 """
 PACKAGE VALIDATOR TO ENCODE SPECIAL CHARS
 """
@@ -1154,16 +1134,19 @@ PACKAGE VALIDATOR TO ENCODE SPECIAL CHARS
 @scheming_validator
 def multiple_url_encode(field, schema):
     def validator(key, data, errors, context):
-        value = json.loads(data[key])
+        value = dh.dge_decode_json_value(data, key)
 
         log.debug('[multiple_url_encode] values "%s"', value)
 
         if not isinstance(value, list):
             raise Exception()
 
-        value = json.dumps([_url_encode(url) for url in value])
+        encoded = [_url_encode(url) for url in value]
 
-        data[key] = value
+        # Only serialized again when the encoding changes any URL or the
+        # value was not JSON text (a list given through the API)
+        if encoded != value or not isinstance(data[key], str):
+            data[key] = dh.dge_json_text(encoded)
 
     return validator
 
@@ -1185,7 +1168,7 @@ def at_least_one_required(field, schema):
         if value is not missing:
             if isinstance(value, str):
                 try:
-                    value = json.loads(value)
+                    value = dh.dge_decode_json_value(data, key)
                 except ValueError:
                     errors[key].append(_('Failed to decode JSON string'))
                     return
@@ -1216,7 +1199,7 @@ def format_validator(field, schema):
         """
         log.debug('{} validating. Key: {}'.format(header, key))
         # If there is no guid, data source is DCAT-AP-ES web form
-        if not dh.dge_has_guid(data):
+        if dh.dge_get_package_profile(data, context).is_manual:
             value = data[key]
             if value is not missing:
                 # In DCAT-AP-ES 1.0.0 FORM, distribution format will be stored in extra resource_format as an European Vocabulary URI.
@@ -1338,9 +1321,8 @@ def multilanguage_tags(field, schema):
         prefix = key[-1] + '-'
         extras = data.get(key[:-1] + ('__extras',), {})
 
-        for name, text in extras.items():
-            if not name.startswith(prefix):
-                continue
+        for name, text in dh.dge_get_extras_by_prefix(
+                data, key[:-1], prefix, context):
             lang = name.split('-', 1)[1]
             m = re.match(BCP_47_LANGUAGE, lang)
             if not m:
@@ -1383,6 +1365,7 @@ def multilanguage_tags(field, schema):
 
         for lang in output:
             del extras[prefix + lang]
+        dh.dge_reset_extras_index(key[:-1], context)
         
         # Avoiding storing empty dict
         if output and len(output) > 0:
@@ -1409,8 +1392,8 @@ OVERWRITES CKANEXT-SCHEMING 'SCHEMING_MULTIPLE_CHOICE' VALIDATOR IN ORDER TO LET
 def multiple_theme_choice(field, schema):
     required = field.get('required', False)
     header = '[multiple_theme_choice VALIDATOR]'
-    theme_choice_order = [c['value'] for c in ds_constants.DATOSGOB_DCT_THEME_CHOICES]
-    theme_choice_values = set(theme_choice_order)
+    theme_choice_order = ds_vocabulary.THEMES.values
+    theme_choice_values = ds_vocabulary.THEMES.by_value
 
     def validator(key, data, errors, context):
         log.debug('{} validating. Key: {} required: {}'.format(header, key, required))
@@ -1470,7 +1453,7 @@ def multiple_theme_choice(field, schema):
             ]
             choice_values = set(choice_order)
 
-        is_dcatapes = dh.dge_is_dcatapes_application_profile(data)
+        is_dcatapes = dh.dge_get_package_profile(data, context).is_dcatapes
         
         selected = set()
         vocabularies_uris = []
@@ -1545,12 +1528,45 @@ def allow_empty_scheming_isodatetime(field, schema):
 
     return validator
 
+# YYYY, YYYY-MM, YYYY-MM-DD and YYYY-MM-DDTHH:MM[:SS]
+_iso_date_re = re.compile(
+    r'([0-9]{4})(?:-(0[1-9]|1[0-2])(?:-(0[1-9]|[12][0-9]|3[01])'
+    r'(?:[T ]([01][0-9]|2[0-3]):([0-5][0-9])(?::([0-5][0-9]))?)?)?)?')
+
+def _iso_date_to_datetime(match):
+    '''
+    Return the datetime of a _iso_date_re match, or None when the day is
+    out of range for the month
+    '''
+    year, month, day, hour, minute, second = match.groups()
+    try:
+        return datetime.datetime(int(year), int(month or 1), int(day or 1),
+                                 int(hour or 0), int(minute or 0),
+                                 int(second or 0))
+    except ValueError:
+        return None
+
+def _form_date_to_datetime(value):
+    '''
+    Parse a date (and time) of the form, falling back to
+    h.date_str_to_datetime when it is not YYYY-MM-DD[ HH:MM[:SS]]
+    '''
+    match = _iso_date_re.fullmatch(value)
+    date = _iso_date_to_datetime(match) if match and match.group(3) else None
+    return date or h.date_str_to_datetime(value)
+
 def validate_date(value):
     if value:
         if isinstance(value, datetime.datetime):
             return value
         else:
             try:
+                # Fast path for the usual formats, dates with time are
+                # checked here instead of parsing them with dateutil
+                match = _iso_date_re.fullmatch(value)
+                if match and (match.group(4) is None or
+                              _iso_date_to_datetime(match)):
+                    return value
                 if is_year(value) or is_year_month(value) or is_date(value):
                     return value
             except TypeError:
@@ -1571,8 +1587,8 @@ VALIDATOR FOR DCT:SPATIAL IN BOTH NTI AND DCATAPES PROFILES
 def multiple_select_spatial(field, schema):
     required = field.get('required', False)
     header = '[multiple_select_spatial VALIDATOR]'
-    spatial_choice_order = [c['value'] for c in ds_constants.DATOSGOB_DCT_SPATIAL_CHOICES]
-    spatial_choice_values = set(spatial_choice_order)
+    spatial_choice_order = ds_vocabulary.SPATIAL.values
+    spatial_choice_values = ds_vocabulary.SPATIAL.by_value
     
     def validator(key, data, errors, context):
         log.debug('{} validating. Key: {}'.format(header, key))
@@ -1617,7 +1633,7 @@ def multiple_select_spatial(field, schema):
 
             if isinstance(value, str) and value.startswith('['):
                 try:
-                    value = json.loads(value)
+                    value = dh.dge_decode_json_value(data, key)
                 except ValueError:
                     errors[key].append(_('Failed to decode JSON string'))
                     return
@@ -1632,7 +1648,7 @@ def multiple_select_spatial(field, schema):
         else:
             value = []
 
-        application_profile = dh.dge_get_application_profile(data)
+        application_profile = dh.dge_get_package_profile(data, context).application_profile
         
         if value:
             selected = set()
@@ -1653,7 +1669,7 @@ def multiple_select_spatial(field, schema):
 
             if not errors[key] and len(selected) > 0:
                 if not application_profile == ds_constants.DCATAPES_100:
-                    out = [{'uri': spatial_choice, 'geometry': '', 'bbox': '', 'centroid': ''} for spatial_choice in spatial_choice_order if spatial_choice in selected]
+                    out = [_spatial_choice(spatial_choice) for spatial_choice in spatial_choice_order if spatial_choice in selected]
                     data[key] = json.dumps(out)
 
                     if field.get('required') and not selected:
@@ -1665,9 +1681,23 @@ def multiple_select_spatial(field, schema):
     return validator
 
 
+def _spatial_choice(spatial_uri):
+    '''
+    Return the stored item of a datos.gob.es territory, with bbox and centroid
+    from the bundled gazetteer
+    '''
+    location = ds_vocabulary.get_spatial_location(spatial_uri) or {}
+    return {'uri': spatial_uri, 'geometry': '',
+            'bbox': location.get('bbox', ''),
+            'centroid': location.get('centroid', '')}
+
+
 def _unique_identifier(identifier_value, data, key, errors):
     '''
-    Validates if dct:identifier is unique in current dataset
+    Validates if dct:identifier is unique in current dataset.
+    All the identifiers are checked in a single query against the
+    dge_package_identifier index, or the extras until backfill-identifiers
+    has completed, and every duplicate is reported
     '''
     header = '[unique_identifier VALIDATOR]'
     log.debug('{} validating. Key: {}'.format(header, key))
@@ -1676,47 +1706,21 @@ def _unique_identifier(identifier_value, data, key, errors):
             identifier_value = json.loads(identifier_value)
         if not isinstance(identifier_value, list):
             raise Exception()
-        key_to_check = ('id',)
-        if key_to_check in data:
-            package_id = data[('id',)]
-            for identifier in identifier_value:
-                _check_identifier(errors, key, identifier, package_id)
+        package_id = data.get(('id',))
+        if ds_model.is_backfill_complete(
+                ds_constants.BACKFILL_IDENTIFIERS_CHECKPOINT):
+            conflicts = ds_model.find_identifier_conflicts(
+                identifier_value, package_id)
         else:
+            conflicts = ds_model.find_identifier_conflicts_in_extras(
+                identifier_value, package_id)
+        if conflicts:
             for identifier in identifier_value:
-                _check_identifier(errors, key, identifier, None)
-
-
-def _check_identifier(errors, key, identifier_value, package_id=None):
-    '''
-    Checks if the dct:identifier already exists in database.
-    Adds an error message if true
-    '''
-    from ckan.model import PackageExtra, Package
-    
-    query = '''
-            select pe.package_id
-            from public.package_extra pe
-            where pe.key = 'identifier'
-            and '{p0}' = any (select json_array_elements_text(pe.value::json));
-            '''.format(p0=identifier_value)
-    results = model.Session.execute(query).fetchall()
-
-    if results and len(results) > 0:
-        packages = [result[0] for result in results]
-        active_packages = model.Session.query(Package).filter(
-            Package.id.in_(packages)).filter_by(state='active')
-        if active_packages.count() > 0:
-            if package_id:
-                for package in active_packages:
-                    if package_id != package.id:
-                        errors[key].append(
-                            (f'El campo identificador (dct:identifier) debe ser \u00FAnico. Actualmente existe un dataset con el identificador: {identifier_value}'))
-                        raise StopOnError
-            else:
-                if active_packages.count() > 0:
+                if identifier in conflicts:
                     errors[key].append(
-                        (f'El campo identificador (dct:identifier) debe ser \u00FAnico. Actualmente existe un dataset con el identificador: {identifier_value}'))
-                    raise StopOnError
+                        (f'El campo identificador (dct:identifier) debe ser \u00FAnico. Actualmente existe un dataset con el identificador: {identifier}'))
+                    del conflicts[identifier]
+            raise StopOnError
 
 @scheming_validator
 @register_validator
@@ -0,0 +1,76 @@
+# Copyright (C) 2026 Entidad Pública Empresarial Red.es
+#
+# This file is part of "dge-scheming (datos.gob.es)".
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import logging
+
+from flask import Blueprint, jsonify
+
+import ckan.model as model
+import ckan.plugins.toolkit as toolkit
+from ckanext.dge_scheming import helpers
+
+log = logging.getLogger(__name__)
+
+dge_scheming = Blueprint(u'dge_scheming', __name__)
+
+
+def organization_autocomplete():
+    u'''
+    Search active organizations by name or title.
+    Accepts the query string parameters 'incomplete' (or 'q'), 'page',
+    'limit', 'lang' and 'permission'. Only the organizations where the
+    user has 'permission' (create_dataset by default, none if empty) are
+    returned, all of them for sysadmins. The response keeps the ResultSet
+    format expected by the CKAN autocomplete module and adds the total
+    count and page.
+    '''
+    try:
+        toolkit.check_access(u'organization_list', {u'model': model,
+                                                    u'user': toolkit.c.user})
+    except toolkit.NotAuthorized:
+        return jsonify({u'error': u'Not authorized'}), 403
+
+    args = toolkit.request.args
+    try:
+        page = int(args.get(u'page', 1))
+        limit = int(args.get(u'limit', 0)) or None
+    except ValueError:
+        return jsonify({u'error': u'page and limit must be integers'}), 400
+
+    permission = args.get(u'permission', u'create_dataset')
+    organization_ids = helpers.dge_organization_ids_for_user(
+        permission) if permission else None
+    search = helpers.dge_search_organizations(
+        q=args.get(u'incomplete', args.get(u'q', u'')),
+        page=page, limit=limit, language=args.get(u'lang') or None,
+        organization_ids=organization_ids)
+    return jsonify({u'ResultSet': {
+        u'Result': search[u'results'],
+        u'count': search[u'count'],
+        u'page': search[u'page'],
+        u'limit': search[u'limit'],
+    }})
+
+
+dge_scheming.add_url_rule(
+    u'/api/util/dge_scheming/organization/autocomplete',
+    view_func=organization_autocomplete)
+
+
+def get_blueprints():
+    return [dge_scheming]
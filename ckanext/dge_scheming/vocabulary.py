@@ -0,0 +1,224 @@
+# Copyright (C) 2026 Entidad Pública Empresarial Red.es
+#
+# This file is part of "dge-scheming (datos.gob.es)".
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import json
+import os
+import threading
+
+import ckanext.dge_scheming.constants as ds_constants
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class FrozenDict(dict):
+    '''
+    dict that can not be modified once built. It is still a dict, so
+    templates and scheming helpers (scheming_language_text) handle it as
+    the plain dicts of constants.py.
+    '''
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError('%s is immutable' % type(self).__name__)
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return FrozenDict((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class Vocabulary(object):
+    '''
+    Immutable registry of the choices of a controlled vocabulary, built once
+    at import from the lists of constants.py and indexed by value, notation
+    and dcat_ap URI, with a map of labels per language.
+    '''
+    __slots__ = ('name', 'choices', 'values', 'by_value', 'by_notation',
+                 'by_dcat_ap', 'labels')
+
+    def __init__(self, name, choices):
+        choices = _freeze(choices)
+        by_dcat_ap = {}
+        labels = {}
+        for choice in choices:
+            if choice.get('dcat_ap'):
+                by_dcat_ap.setdefault(choice['dcat_ap'], []).append(choice)
+            for language, label in choice.get('label', {}).items():
+                labels.setdefault(language, {})[choice['value']] = label
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'choices', choices)
+        object.__setattr__(self, 'values',
+                           tuple(choice['value'] for choice in choices))
+        object.__setattr__(self, 'by_value', FrozenDict(
+            (choice['value'], choice) for choice in choices))
+        object.__setattr__(self, 'by_notation', FrozenDict(
+            (choice['notation'], choice) for choice in choices
+            if choice.get('notation')))
+        object.__setattr__(self, 'by_dcat_ap', FrozenDict(
+            (uri, tuple(themes)) for uri, themes in by_dcat_ap.items()))
+        object.__setattr__(self, 'labels', FrozenDict(
+            (language, FrozenDict(values))
+            for language, values in labels.items()))
+
+    def __setattr__(self, name, value):
+        raise TypeError('Vocabulary is immutable')
+
+    def __contains__(self, value):
+        return value in self.by_value
+
+    def __iter__(self):
+        return iter(self.choices)
+
+    def __len__(self):
+        return len(self.choices)
+
+    def get(self, value):
+        '''
+        Return the choice of value, or None if it is not in the vocabulary
+        '''
+        return self.by_value.get(value)
+
+    def label(self, value, language, default_language=None):
+        '''
+        :param value: choice value
+        :param language: language of the label
+        :param default_language: language used when there is no label in
+            language
+
+        Return the label of value, or None if it is not in the vocabulary
+        '''
+        label = self.labels.get(language, {}).get(value)
+        if label is None and default_language:
+            label = self.labels.get(default_language, {}).get(value)
+        return label
+
+
+VOCABULARIES = FrozenDict(
+    (name, Vocabulary(name, choices))
+    for name, choices in ds_constants.NTI_CHOICES_FIELDS.items())
+
+LANGUAGES = VOCABULARIES[ds_constants.NTI_CHOICES_FIELD_LANGUAGE]
+SPATIAL = VOCABULARIES[ds_constants.NTI_CHOICES_FIELD_SPATIAL]
+THEMES = VOCABULARIES[ds_constants.NTI_CHOICES_FIELD_THEME]
+FREQUENCIES = VOCABULARIES[ds_constants.NTI_CHOICES_FIELD_FREQUENCY]
+
+
+
+def _spatial_ancestors(choices):
+    '''
+    Return the ancestor closure of the territories, from the nearest
+    ancestor to the country. DATOSGOB_DCT_SPATIAL_CHOICES lists the country
+    first and every autonomous community followed by its provinces.
+    '''
+    ancestors = {}
+    country = community = None
+    for choice in choices:
+        uri = choice['value']
+        kind = uri[len(ds_constants.SPATIAL_TERRITORY_PREFIX):].split('/')[0]
+        if kind == ds_constants.SPATIAL_KIND_COUNTRY:
+            country = uri
+            ancestors[uri] = ()
+        elif kind == ds_constants.SPATIAL_KIND_COMMUNITY:
+            community = uri
+            ancestors[uri] = (country,) if country else ()
+        else:
+            ancestors[uri] = tuple(
+                parent for parent in (community, country) if parent)
+    return FrozenDict(ancestors)
+
+SPATIAL_ANCESTORS = _spatial_ancestors(SPATIAL)
+
+FREQUENCY_TYPES = frozenset(ds_constants.FREQUENCY_VALUES)
+FREQUENCY_IDENTIFIERS = frozenset(ds_constants.FREQUENCY_IDENTIFIERS)
+
+
+def get_vocabulary(name):
+    '''
+    :param name: vocabulary name, one of the NTI_CHOICES_FIELD_* constants
+
+    Return the Vocabulary, raising KeyError for an unknown name
+    '''
+    return VOCABULARIES[name]
+
+
+
+def get_spatial_closure(uris):
+    '''
+    :param uris: datos.gob.es territory URIs
+
+    Return a list with the URIs and all their ancestors, without
+    duplicates. URIs out of the vocabulary are kept without ancestors.
+    '''
+    closure = {}
+    for uri in uris:
+        closure[uri] = None
+        for ancestor in SPATIAL_ANCESTORS.get(uri, ()):
+            closure[ancestor] = None
+    return list(closure)
+
+SPATIAL_GAZETTEER_PATH = os.path.join(os.path.dirname(__file__),
+                                      'spatial_gazetteer.json')
+_spatial_gazetteer = None
+_spatial_gazetteer_lock = threading.Lock()
+
+
+def _load_spatial_gazetteer():
+    global _spatial_gazetteer
+    with _spatial_gazetteer_lock:
+        if _spatial_gazetteer is None:
+            with open(SPATIAL_GAZETTEER_PATH, encoding='utf-8') as f:
+                extents = json.load(f)
+            gazetteer = {}
+            for uri, (west, south, east, north, lon, lat) in extents.items():
+                gazetteer[uri] = FrozenDict({
+                    'extent': (west, south, east, north),
+                    'point': (lon, lat),
+                    'bbox': json.dumps({
+                        'type': 'Polygon',
+                        'coordinates': [[[west, south], [east, south],
+                                         [east, north], [west, north],
+                                         [west, south]]]}),
+                    'centroid': json.dumps({
+                        'type': 'Point', 'coordinates': [lon, lat]}),
+                })
+            _spatial_gazetteer = FrozenDict(gazetteer)
+    return _spatial_gazetteer
+
+
+def get_spatial_location(uri):
+    '''
+    :param uri: datos.gob.es territory URI (DATOSGOB_DCT_SPATIAL_CHOICES)
+
+    Return a dict with the extent (west, south, east, north) and point
+    (lon, lat) of the territory in WGS84, and the same as GeoJSON bbox
+    (Polygon) and centroid (Point) strings, or None if the URI is not in
+    the gazetteer. The bundled gazetteer is loaded on first use.
+    '''
+    gazetteer = _spatial_gazetteer
+    if gazetteer is None:
+        gazetteer = _load_spatial_gazetteer()
+    return gazetteer.get(uri)